@@ -0,0 +1,130 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# Сколько запрос может выполняться, прежде чем ключ считается брошенным:
+# дольше таймаута воркера gunicorn (30 с по умолчанию)
+IDEMPOTENCY_LEASE = timedelta(seconds=60)
+
+
+def request_fingerprint(request):
+    """Хэш тела запроса: ключ нельзя переиспользовать для других данных."""
+    raw = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def purge_expired_keys(now=None):
+    return IdempotencyKey.objects.filter(
+        created_at__lt=(now or timezone.now()) - IDEMPOTENCY_TTL
+    ).delete()[0]
+
+
+def _replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response(
+            {"detail": "Ключ идемпотентности уже использован с другими данными"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    if record.status_code is None:
+        return Response(
+            {"detail": "Запрос с этим ключом ещё выполняется"},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    return Response(record.response, status=record.status_code, headers={"Idempotent-Replayed": "true"})
+
+
+def _take_over(record):
+    """
+    Запрос, который выполняется дольше IDEMPOTENCY_LEASE, считается
+    брошенным: воркер убит или снят по таймауту, и обработчик исключений
+    не удалил ключ. Повтор забирает ключ себе условным UPDATE — из
+    параллельных повторов это удаётся только одному.
+    """
+    now = timezone.now()
+    if record.started_at > now - IDEMPOTENCY_LEASE:
+        return False
+
+    taken = IdempotencyKey.objects.filter(
+        pk=record.pk, status_code__isnull=True, started_at=record.started_at
+    ).update(started_at=now)
+
+    record.started_at = now
+    return bool(taken)
+
+
+def idempotent(view_method):
+    """
+    Повтор POST с тем же заголовком Idempotency-Key (мобильный клиент
+    переспрашивает после таймаута) получает сохранённый ответ первого
+    запроса: тело представления — корзина, остатки, ЮKassa — не выполняется.
+
+    Ключ сначала записывается отдельной строкой (уникальность по
+    пользователю, пути и ключу), поэтому декоратор ставится снаружи
+    transaction.atomic: параллельный дубль видит «ещё выполняется», а откат
+    транзакции представления не теряет сохранённый ответ. Ответы с кодом 5xx
+    и исключения не сохраняются — такой запрос можно повторить заново.
+    Ключ, брошенный на середине, повтор забирает после IDEMPOTENCY_LEASE.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response(
+                {"detail": "Слишком длинный ключ идемпотентности"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request)
+        lookup = {"user": request.user, "path": request.path, "key": key}
+
+        record, created = IdempotencyKey.objects.get_or_create(
+            **lookup, defaults={"fingerprint": fingerprint}
+        )
+        if not created and record.created_at < timezone.now() - IDEMPOTENCY_TTL:
+            # Просроченный ключ считается новым
+            record.delete()
+            record, created = IdempotencyKey.objects.get_or_create(
+                **lookup, defaults={"fingerprint": fingerprint}
+            )
+        if not created and not (
+            record.fingerprint == fingerprint
+            and record.status_code is None
+            and _take_over(record)
+        ):
+            return _replay(record, fingerprint)
+
+        # Ключ меняется, только пока он наш: если запрос пережил свою аренду
+        # и ключ забрал повтор, ответ сохранит повтор
+        owned = IdempotencyKey.objects.filter(pk=record.pk, started_at=record.started_at)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            owned.delete()
+            raise
+
+        if response.status_code >= 500:
+            owned.delete()
+            return response
+
+        owned.update(status_code=response.status_code, response=response.data)
+
+        return response
+
+    return wrapper
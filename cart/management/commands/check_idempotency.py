@@ -0,0 +1,150 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from cart.idempotency import IDEMPOTENCY_LEASE
+from cart.models import CartItem, IdempotencyKey
+from catalog.models import Category, Product, ProductVariant, SubCategory
+from catalog.seeding import Rollback
+
+ADD_TO_CART = "/api/cart/add/"
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверить повторы POST с заголовком Idempotency-Key на добавлении "
+        "в корзину: повтор получает сохранённый ответ, ключ брошенного "
+        "запроса (воркер убит посреди выполнения) после аренды забирает "
+        "повтор, ключ выполняющегося запроса и ключ с другими данными "
+        "отклоняются. Данные создаются во временной транзакции и откатываются."
+    )
+
+    def handle(self, *args, **options):
+        results = []
+
+        try:
+            with transaction.atomic():
+                self.variant = self.seed()
+                user = User.objects.create_user(username="idempotency@example.com", password="idempotency-check")
+                self.client = APIClient(HTTP_HOST="localhost")
+                self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+                self.user = user
+
+                results.append(("Повтор получает сохранённый ответ", self.check_replay()))
+                results.append(("Брошенный ключ забирает повтор", self.check_abandoned()))
+                results.append(("Выполняющийся запрос: 409", self.check_in_flight()))
+                results.append(("Другие данные с тем же ключом: 422", self.check_mismatch()))
+
+                raise Rollback
+        except Rollback:
+            pass
+
+        failures = 0
+
+        for title, errors in results:
+            if errors:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {title} ({'; '.join(errors)})"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK   {title}"))
+
+        if failures:
+            raise CommandError(f"Ошибки идемпотентности: {failures}")
+
+    def seed(self):
+        category = Category.objects.create(name="Idempotency", gender="F")
+        subcategory = SubCategory.objects.create(category=category, name="Idempotency", size_model="standard")
+        product = Product.objects.create(
+            subcategory=subcategory, name="Idempotency", price_rub=1000, price_kzt=5000, price_byn=30
+        )
+        return ProductVariant.objects.create(
+            product=product, color_name="Черный", color_hex="#292b34", size="M", stock=100
+        )
+
+    def add(self, key, quantity=1):
+        return self.client.post(
+            ADD_TO_CART, {"variant": self.variant.pk, "quantity": quantity},
+            format="json", secure=True, HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def quantity(self):
+        item = CartItem.objects.filter(cart__user=self.user, variant=self.variant).first()
+        return item.quantity if item else 0
+
+    def interrupt(self, key, started_at):
+        """
+        Строка ключа, как её оставляет запрос, который не дошёл до ответа:
+        status_code пустой. Отпечаток тела — от настоящего запроса.
+        """
+        IdempotencyKey.objects.filter(user=self.user, key=key).update(
+            status_code=None, response=None, started_at=started_at
+        )
+
+    def check_replay(self):
+        before = self.quantity()
+        first = self.add("replay")
+        second = self.add("replay")
+        errors = []
+
+        if first.status_code >= 400:
+            errors.append(f"HTTP {first.status_code}")
+        if second.status_code != first.status_code or second.json() != first.json():
+            errors.append("повтор вернул другой ответ")
+        if second.headers.get("Idempotent-Replayed") != "true":
+            errors.append("нет заголовка Idempotent-Replayed")
+        if self.quantity() != before + 1:
+            errors.append(f"количество {self.quantity()}, ожидалось {before + 1}")
+
+        return errors
+
+    def check_abandoned(self):
+        self.add("abandoned")
+        self.interrupt("abandoned", timezone.now() - IDEMPOTENCY_LEASE - timedelta(seconds=1))
+
+        before = self.quantity()
+        retry = self.add("abandoned")
+        record = IdempotencyKey.objects.get(user=self.user, key="abandoned")
+        errors = []
+
+        if retry.status_code >= 400 or retry.headers.get("Idempotent-Replayed"):
+            errors.append(f"повтор не выполнен: HTTP {retry.status_code}")
+        if self.quantity() != before + 1:
+            errors.append(f"количество {self.quantity()}, ожидалось {before + 1}")
+        if record.status_code != retry.status_code:
+            errors.append("ответ повтора не сохранён")
+
+        return errors
+
+    def check_in_flight(self):
+        self.add("in-flight")
+        self.interrupt("in-flight", timezone.now())
+
+        before = self.quantity()
+        retry = self.add("in-flight")
+        errors = []
+
+        if retry.status_code != 409:
+            errors.append(f"HTTP {retry.status_code}")
+        if self.quantity() != before:
+            errors.append("тело представления выполнено повторно")
+
+        return errors
+
+    def check_mismatch(self):
+        self.add("mismatch")
+
+        before = self.quantity()
+        retry = self.add("mismatch", quantity=2)
+        errors = []
+
+        if retry.status_code != 422:
+            errors.append(f"HTTP {retry.status_code}")
+        if self.quantity() != before:
+            errors.append("тело представления выполнено повторно")
+
+        return errors
@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 
 class Cart(models.Model):
@@ -35,4 +37,38 @@ class CartItem(models.Model):
 
     @property
     def total_price(self):
-        return self.variant.product.price_rub * self.quantity
\ No newline at end of file
+        return self.variant.product.price_rub * self.quantity
+
+class IdempotencyKey(models.Model):
+    """
+    Ответ на запрос с заголовком Idempotency-Key (см. cart.idempotency).
+    status_code пустой, пока запрос ещё выполняется (с started_at).
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys"
+    )
+    key = models.CharField(max_length=255)
+    path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Начало выполнения; повтор забирает ключ после IDEMPOTENCY_LEASE
+    started_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "path", "key"],
+                name="idempotency_key_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["created_at"], name="idempotency_key_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.path})"
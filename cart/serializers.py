@@ -1,9 +1,12 @@
 from decimal import Decimal
 from rest_framework import serializers
 
-from .models import Cart, CartItem
+from catalog.bought_together import BOUGHT_TOGETHER_LIMIT, cart_bought_together_ids
+from catalog.queries import load_product_cards, ordered_cards
+from catalog.serializers import ProductListSerializer
 
-AVAILABLE_CURRENCIES = {"rub", "kzt", "byn"}
+from .models import Cart, CartItem
+from .services import get_cart_contents, get_currency, product_prices
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -36,23 +39,38 @@ class CartItemSerializer(serializers.ModelSerializer):
             "availability_message",
         ]
 
-    def _get_price(self, product):
-        currency = self.context.get("currency", "rub")
-
-        if currency not in AVAILABLE_CURRENCIES:
-            currency = "rub"
+    def to_representation(self, obj):
+        """
+        Быстрый путь без обхода полей DRF, вывод совпадает с обычным
+        (проверяет catalog.tests.FastSerializerTests).
+        """
+        variant = obj.variant
+        product = variant.product
+        is_available = product.is_visible and variant.available > 0
+        price = self._get_price(product)
+
+        return {
+            "id": obj.id,
+            "variant": obj.variant_id,
+            "product_id": product.id,
+            "product_name": product.name,
+            "product_price": price,
+            "product_image_url": self.get_product_image_url(obj),
+            "color": variant.color_name,
+            "size": variant.size,
+            "quantity": obj.quantity,
+            "total_price": price * obj.quantity if is_available else Decimal("0.00"),
+            "is_available": is_available,
+            "availability_message": self.get_availability_message(obj),
+        }
 
-        if currency == "kzt":
-            return product.price_kzt
-        if currency == "byn":
-            return product.price_byn
-
-        return product.price_rub
+    def _get_price(self, product):
+        return product_prices(product)[get_currency(self.context.get("currency"))]
 
     def get_is_available(self, obj):
         product = obj.variant.product
 
-        return product.is_visible and obj.variant.stock > 0
+        return product.is_visible and obj.variant.available > 0
 
     def get_availability_message(self, obj):
         product = obj.variant.product
@@ -60,7 +78,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         if not product.is_visible:
             return "Товар на текущий момент недоступен"
 
-        if obj.variant.stock <= 0:
+        if obj.variant.available <= 0:
             return "Товар закончился на складе"
 
         return None
@@ -89,16 +107,15 @@ class CartItemSerializer(serializers.ModelSerializer):
 class CartSerializer(serializers.ModelSerializer):
     items = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
+    bought_together = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
-        fields = ["id", "items", "total_price"]
+        fields = ["id", "items", "total_price", "bought_together"]
 
     def get_items(self, obj):
-        queryset = obj.items.select_related("variant__product").order_by("id")
-
         serializer = CartItemSerializer(
-            queryset,
+            get_cart_contents(obj).items,
             many=True,
             context=self.context
         )
@@ -106,31 +123,19 @@ class CartSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_total_price(self, obj):
-        currency = self.context.get("currency", "rub")
-
-        total = Decimal("0.00")
-
-        queryset = obj.items.select_related("variant__product")
-
-        for item in queryset:
-            product = item.variant.product
-
-            if not product.is_visible:
-                continue
-
-            if item.variant.stock <= 0:
-                continue
-
-            if currency == "kzt":
-                price = product.price_kzt
-            elif currency == "byn":
-                price = product.price_byn
-            else:
-                price = product.price_rub
+        # Итоги посчитаны вместе с позициями (cart.services.CartContents)
+        return get_cart_contents(obj).totals[get_currency(self.context.get("currency"))]
+
+    def get_bought_together(self, obj):
+        # Берём с запасом: скрытые товары отбрасываются при загрузке карточек
+        product_ids = cart_bought_together_ids(
+            get_cart_contents(obj).product_ids(),
+            limit=BOUGHT_TOGETHER_LIMIT * 2,
+        )
 
-            total += price * item.quantity
+        products = ordered_cards(product_ids, load_product_cards(product_ids), BOUGHT_TOGETHER_LIMIT)
 
-        return total
+        return ProductListSerializer(products, many=True, context=self.context).data
 
 
 class AddToCartSerializer(serializers.Serializer):
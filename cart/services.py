@@ -0,0 +1,115 @@
+from decimal import Decimal
+
+from .models import Cart, CartItem
+
+AVAILABLE_CURRENCIES = {"rub", "kzt", "byn"}
+DEFAULT_CURRENCY = "rub"
+
+# Колонки, нужные для вывода корзины и оформления заказа: без описания
+# и поискового вектора товара
+CART_ITEM_FIELDS = (
+    "id", "quantity", "variant_id",
+    "cart__id", "cart__user_id", "cart__created_at",
+    "variant__id", "variant__product_id", "variant__color_name",
+    "variant__color_hex", "variant__size", "variant__stock", "variant__reserved",
+    "variant__product__id", "variant__product__name", "variant__product__is_visible",
+    "variant__product__price_rub", "variant__product__price_kzt", "variant__product__price_byn",
+    "variant__product__main_image",
+)
+
+
+def get_currency(value):
+    return value if value in AVAILABLE_CURRENCIES else DEFAULT_CURRENCY
+
+
+def product_prices(product):
+    return {
+        "rub": product.price_rub,
+        "kzt": product.price_kzt,
+        "byn": product.price_byn,
+    }
+
+
+class CartContents:
+    """
+    Корзина пользователя, загруженная одним запросом, и всё, что по ней
+    считается, — за один проход по позициям:
+
+    items — позиции (CartItem с variant и product);
+    totals — сумма по валютам для позиций, которые есть на складе (корзина);
+    orderable — позиции, которые можно оформить (товар виден и остатка
+    хватает на количество): {"item", "variant", "product", "quantity", "prices"};
+    subtotals — сумма orderable по валютам (предпросмотр и оформление).
+    """
+
+    def __init__(self, cart, items):
+        self.cart = cart
+        self.items = items
+        if cart is not None:
+            cart._contents = self
+        self.totals = {currency: Decimal("0.00") for currency in AVAILABLE_CURRENCIES}
+        self.subtotals = {currency: Decimal("0") for currency in AVAILABLE_CURRENCIES}
+        self.orderable = []
+
+        for item in items:
+            variant = item.variant
+            product = variant.product
+            if not product.is_visible or variant.available <= 0:
+                continue
+
+            prices = product_prices(product)
+            for currency, price in prices.items():
+                self.totals[currency] += price * item.quantity
+
+            if variant.available < item.quantity:
+                continue
+
+            for currency, price in prices.items():
+                self.subtotals[currency] += price * item.quantity
+            self.orderable.append({
+                "item": item,
+                "variant": variant,
+                "product": product,
+                "quantity": item.quantity,
+                "prices": prices,
+            })
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def product_ids(self):
+        return [item.variant.product_id for item in self.items]
+
+
+def cart_items():
+    return (
+        CartItem.objects
+        .select_related("cart", "variant__product")
+        .only(*CART_ITEM_FIELDS)
+        .order_by("id")
+    )
+
+
+def get_cart_contents(cart):
+    """CartContents уже загруженной корзины (считается один раз)."""
+    if not hasattr(cart, "_contents"):
+        CartContents(cart, list(cart_items().filter(cart=cart)))
+    return cart._contents
+
+
+def load_cart(user, create=False):
+    """
+    Позиции корзины вместе с самой корзиной, вариантами и товарами — одним
+    запросом. Корзина без позиций нужна только для вывода (create=True,
+    как раньше get_or_create), иначе для пустой корзины cart — None.
+    """
+    items = list(cart_items().filter(cart__user=user))
+
+    if items:
+        cart = items[0].cart
+    elif create:
+        cart, _ = Cart.objects.get_or_create(user=user)
+    else:
+        cart = None
+
+    return CartContents(cart, items)
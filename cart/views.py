@@ -8,33 +8,31 @@ from rest_framework import status
 
 from catalog.models import ProductVariant
 
+from .idempotency import idempotent
 from .models import Cart, CartItem
 from .serializers import (
     CartSerializer,
     AddToCartSerializer,
     UpdateCartItemSerializer,
 )
+from .services import get_currency, load_cart
 
 
 MAX_QUANTITY_PER_VARIANT = 5
-AVAILABLE_CURRENCIES = {"rub", "kzt", "byn"}
 
 
 class CartView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-
-        currency = request.query_params.get("currency", "rub")
-        if currency not in AVAILABLE_CURRENCIES:
-            currency = "rub"
+        # Корзина, позиции и итоги — одним запросом
+        contents = load_cart(request.user, create=True)
 
         serializer = CartSerializer(
-            cart,
+            contents.cart,
             context={
                 "request": request,
-                "currency": currency
+                "currency": get_currency(request.query_params.get("currency"))
             }
         )
 
@@ -44,6 +42,7 @@ class CartView(APIView):
 class AddToCartView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     @transaction.atomic
     def post(self, request):
         serializer = AddToCartSerializer(data=request.data)
@@ -51,7 +50,10 @@ class AddToCartView(APIView):
 
         data = serializer.validated_data
 
-        variant = get_object_or_404(ProductVariant, id=data["variant"])
+        variant = get_object_or_404(
+            ProductVariant.objects.select_related("product"),
+            id=data["variant"]
+        )
 
         if not variant.product.is_visible:
             return Response(
@@ -59,7 +61,7 @@ class AddToCartView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if variant.stock <= 0:
+        if variant.available <= 0:
             return Response(
                 {"detail": "Товар закончился на складе"},
                 status=status.HTTP_400_BAD_REQUEST
@@ -80,7 +82,7 @@ class AddToCartView(APIView):
         else:
             new_quantity = item.quantity + requested_quantity
 
-        if new_quantity > variant.stock:
+        if new_quantity > variant.available:
             return Response(
                 {"detail": "Превышен остаток на складе"},
                 status=status.HTTP_400_BAD_REQUEST
@@ -92,8 +94,9 @@ class AddToCartView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        item.quantity = new_quantity
-        item.save()
+        if not created:
+            item.quantity = new_quantity
+            item.save(update_fields=["quantity"])
 
         return Response(
             {"detail": "Товар добавлен в корзину"},
@@ -117,7 +120,7 @@ class UpdateCartItemView(APIView):
 
         new_quantity = serializer.validated_data["quantity"]
 
-        if new_quantity > item.variant.stock:
+        if new_quantity > item.variant.available:
             return Response(
                 {"detail": "Превышен остаток на складе"},
                 status=status.HTTP_400_BAD_REQUEST
@@ -8,6 +8,7 @@ from adminsortable2.admin import SortableAdminMixin
 
 from image_uploader_widget.widgets import ImageUploaderWidget
 
+from .images import thumbnail_url
 from .models import Category, SubCategory, Product, ProductImage, ProductVariant
 
 
@@ -91,7 +92,7 @@ class SubCategoryAdmin(SortableAdminMixin, admin.ModelAdmin):
     def image_preview(self, obj):
         if obj.cover_image:
             return mark_safe(
-                f'<img src="{obj.cover_image.url}" '
+                f'<img src="{thumbnail_url(obj.cover_image, obj.cover_image_derivatives)}" '
                 f'style="height:100px; width:80px; border-radius:8px; object-fit:cover;" />'
             )
         return "—"
@@ -243,7 +244,7 @@ class ProductAdmin(ImageWidgetMixin, admin.ModelAdmin):
     def main_preview(self, obj):
         if obj.main_image:
             return mark_safe(
-                f'<img src="{obj.main_image.url}" '
+                f'<img src="{thumbnail_url(obj.main_image, obj.main_image_derivatives)}" '
                 f'style="height:100px;width:80px;border-radius:8px;object-fit:cover;">'
             )
         return "-"
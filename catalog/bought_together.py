@@ -0,0 +1,247 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations, groupby
+
+from django.db import transaction
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from orders.models import Order, OrderItem, OrderStatus
+
+from .cache import CATALOG_NAMESPACE, bump_cache_version, invalidate_on_commit
+from .models import BoughtTogether, BoughtTogetherProgress, ProductPairCount
+
+TOP_K = 8
+BOUGHT_TOGETHER_LIMIT = 4
+ORDERS_CHUNK = 5000
+ITEMS_CHUNK = 2000
+TOP_K_CHUNK = 1000
+# Ожидающие оплаты заказы отменяются через 10 минут, к этому возрасту
+# статус заказа уже окончательный
+MIN_ORDER_AGE = timedelta(hours=1)
+
+
+def paid_orders():
+    return Order.objects.exclude(status__in=(OrderStatus.PENDING, OrderStatus.CANCELLED))
+
+
+def iter_order_baskets(first_order_id, last_order_id):
+    """
+    Потоково отдаёт множества товаров оплаченных заказов из диапазона
+    (first_order_id, last_order_id], не загружая позиции целиком.
+    """
+    rows = OrderItem.objects.filter(
+        order_id__gt=first_order_id,
+        order_id__lte=last_order_id,
+        order__in=paid_orders(),
+        variant__isnull=False,
+    ).order_by('order_id').values_list('order_id', 'variant__product_id').iterator(chunk_size=ITEMS_CHUNK)
+
+    for _, items in groupby(rows, key=lambda row: row[0]):
+        yield {product_id for _, product_id in items}
+
+
+def count_pairs(baskets):
+    pairs = Counter()
+    for basket in baskets:
+        for first, second in combinations(sorted(basket), 2):
+            pairs[first, second] += 1
+            pairs[second, first] += 1
+    return pairs
+
+
+def add_pair_counts(pairs):
+    """Прибавляет счётчики пар к уже сохранённым (upsert)."""
+    if not pairs:
+        return
+
+    products = {product_id for product_id, _ in pairs}
+    others = {other_id for _, other_id in pairs}
+
+    existing = ProductPairCount.objects.select_for_update().filter(
+        product_id__in=products, other_id__in=others
+    ).values_list('product_id', 'other_id', 'count')
+
+    for product_id, other_id, count in existing:
+        if (product_id, other_id) in pairs:
+            pairs[product_id, other_id] += count
+
+    ProductPairCount.objects.bulk_create(
+        [
+            ProductPairCount(product_id=product_id, other_id=other_id, count=count)
+            for (product_id, other_id), count in pairs.items()
+        ],
+        batch_size=ITEMS_CHUNK,
+        update_conflicts=True,
+        unique_fields=['product', 'other'],
+        update_fields=['count'],
+    )
+
+
+def subtract_pair_counts(pairs):
+    """Вычитает счётчики пар из сохранённых, обнулившиеся пары удаляются."""
+    if not pairs:
+        return
+
+    products = {product_id for product_id, _ in pairs}
+    others = {other_id for _, other_id in pairs}
+
+    existing = ProductPairCount.objects.select_for_update().filter(
+        product_id__in=products, other_id__in=others
+    )
+
+    changed = []
+    emptied = []
+    for pair in existing:
+        if (pair.product_id, pair.other_id) not in pairs:
+            continue
+
+        pair.count -= min(pairs[pair.product_id, pair.other_id], pair.count)
+        if pair.count:
+            changed.append(pair)
+        else:
+            emptied.append(pair.pk)
+
+    ProductPairCount.objects.bulk_update(changed, ['count'], batch_size=ITEMS_CHUNK)
+    ProductPairCount.objects.filter(pk__in=emptied).delete()
+
+
+def refresh_top_k(product_ids, top_k=TOP_K):
+    """Пересобирает BoughtTogether для товаров, чьи пары изменились."""
+    product_ids = sorted(product_ids)
+
+    for start in range(0, len(product_ids), TOP_K_CHUNK):
+        chunk = product_ids[start:start + TOP_K_CHUNK]
+
+        rows = ProductPairCount.objects.filter(
+            product_id__in=chunk,
+        ).annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('product_id'),
+                order_by=[F('count').desc(), F('other_id').asc()],
+            )
+        ).filter(
+            position__lte=top_k
+        ).order_by('product_id', 'position').values_list('product_id', 'other_id')
+
+        neighbours = defaultdict(list)
+        for product_id, other_id in rows:
+            neighbours[product_id].append(other_id)
+
+        BoughtTogether.objects.bulk_create(
+            [
+                BoughtTogether(product_id=product_id, product_ids=neighbours.get(product_id, []))
+                for product_id in chunk
+            ],
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['product_ids', 'updated_at'],
+        )
+
+
+def build_bought_together(rebuild=False, orders_chunk=ORDERS_CHUNK, top_k=TOP_K, log=None):
+    """
+    Инкрементально обрабатывает новые заказы: заказы идут диапазонами id,
+    на каждый диапазон — одна транзакция, в которой прибавляются счётчики
+    пар и сдвигается отметка BoughtTogetherProgress. В конце пересчитывается
+    топ-K только для затронутых товаров и один раз сбрасывается кэш ответов
+    каталога (рекомендации входят в карточку товара).
+    Возвращает (число обработанных заказов, число затронутых товаров).
+    """
+    if rebuild:
+        with transaction.atomic():
+            ProductPairCount.objects.all().delete()
+            BoughtTogether.objects.all().delete()
+            BoughtTogetherProgress.objects.update_or_create(pk=1, defaults={'last_order_id': 0})
+
+    progress = BoughtTogetherProgress.load()
+    last_order_id = Order.objects.filter(
+        created_at__lt=timezone.now() - MIN_ORDER_AGE
+    ).aggregate(last=Max('id'))['last'] or 0
+
+    position = progress.last_order_id
+    baskets_total = 0
+    touched = set()
+
+    while position < last_order_id:
+        chunk_end = min(position + orders_chunk, last_order_id)
+
+        with transaction.atomic():
+            # Отметка блокируется до чтения заказов, как и в forget_order:
+            # отмена заказа из этого диапазона либо дождётся коммита и
+            # вычтет его пары, либо закоммитится раньше, и заказ не попадёт
+            # в подсчёт
+            BoughtTogetherProgress.objects.select_for_update().get(pk=1)
+            baskets = list(iter_order_baskets(position, chunk_end))
+            pairs = count_pairs(baskets)
+            touched.update(product_id for product_id, _ in pairs)
+            add_pair_counts(pairs)
+
+            BoughtTogetherProgress.objects.filter(pk=1).update(
+                last_order_id=chunk_end, updated_at=timezone.now()
+            )
+
+        baskets_total += len(baskets)
+        position = chunk_end
+
+        if log:
+            log(f"Заказы до #{chunk_end}: корзин {len(baskets)}, пар {len(pairs)}")
+
+    refresh_top_k(touched, top_k)
+
+    if touched or rebuild:
+        bump_cache_version(CATALOG_NAMESPACE)
+
+    return baskets_total, len(touched)
+
+
+@transaction.atomic
+def forget_order(order_id):
+    """
+    Оплаченный заказ отменён или удалён: если он уже попал в счётчики пар
+    (id не больше отметки BoughtTogetherProgress), его пары вычитаются и
+    топ-K затронутых товаров пересчитывается. Иначе счётчики только растут,
+    и отменённые заказы остаются в рекомендациях навсегда.
+    Вызывается до удаления позиций заказа, внутри транзакции отмены.
+    """
+    progress = BoughtTogetherProgress.objects.select_for_update().filter(pk=1).first()
+    if progress is None or order_id > progress.last_order_id:
+        return
+
+    basket = set(
+        OrderItem.objects.filter(order_id=order_id, variant__isnull=False)
+        .values_list('variant__product_id', flat=True)
+    )
+    pairs = count_pairs([basket])
+    if not pairs:
+        return
+
+    subtract_pair_counts(pairs)
+    refresh_top_k({product_id for product_id, _ in pairs})
+    invalidate_on_commit(CATALOG_NAMESPACE)
+
+
+def bought_together_ids(product):
+    try:
+        return product.bought_together.product_ids
+    except BoughtTogether.DoesNotExist:
+        return []
+
+
+def cart_bought_together_ids(product_ids, limit=BOUGHT_TOGETHER_LIMIT):
+    """
+    Рекомендации для корзины: соседи всех товаров корзины, чем выше
+    товар в списках и чем в большем числе списков он есть — тем выше.
+    """
+    product_ids = set(product_ids)
+    scores = Counter()
+
+    rows = BoughtTogether.objects.filter(product_id__in=product_ids).values_list('product_ids', flat=True)
+    for neighbours in rows:
+        for position, other_id in enumerate(neighbours):
+            if other_id not in product_ids:
+                scores[other_id] += TOP_K - position
+
+    return [other_id for other_id, _ in scores.most_common(limit)]
@@ -0,0 +1,102 @@
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+CATALOG_NAMESPACE = "catalog"
+SITE_CONFIG_NAMESPACE = "site_config"
+
+
+def get_response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(namespace):
+    return f"response-cache:{namespace}:version"
+
+
+def get_cache_version(namespace):
+    cache = get_response_cache()
+    key = _version_key(namespace)
+
+    version = cache.get(key)
+    if version is None:
+        # Начальная версия — текущее время, чтобы после вытеснения ключа
+        # из кэша не вернуться к номеру, под которым ещё лежат старые ответы.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_cache_version(namespace):
+    cache = get_response_cache()
+    key = _version_key(namespace)
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_on_commit(namespace):
+    transaction.on_commit(lambda: bump_cache_version(namespace))
+
+
+def get_cached_value(namespace, name, factory):
+    """
+    Значение из кэша под текущей версией пространства имён; factory
+    вызывается только при промахе. Подходит для небольших настроек,
+    которые читаются почти в каждом запросе (SiteConfig).
+    """
+    cache = get_response_cache()
+    key = f"response-cache:{namespace}:{get_cache_version(namespace)}:value:{name}"
+
+    value = cache.get(key)
+    if value is None:
+        value = factory()
+        cache.set(key, value, settings.RESPONSE_CACHE_TIMEOUT)
+
+    return value
+
+
+def build_cache_key(namespace, request, extra=None):
+    params = sorted(
+        (key, sorted(values))
+        for key, values in request.query_params.lists()
+    )
+    raw = f"{request.scheme}://{request.get_host()}{request.path}|{params}|{extra}"
+    digest = md5(raw.encode("utf-8")).hexdigest()
+
+    return f"response-cache:{namespace}:{get_cache_version(namespace)}:{digest}"
+
+
+class CachedResponseMixin:
+    """
+    Кэширует успешные GET-ответы публичных представлений.
+    Ключ учитывает хост, путь и все query-параметры (gender, currency,
+    show_on_main и т.д.), а версия пространства имён сбрасывается
+    сигналами при изменении данных (см. catalog.signals).
+    """
+
+    cache_namespace = CATALOG_NAMESPACE
+    cache_timeout = None
+
+    def get(self, request, *args, **kwargs):
+        cache = get_response_cache()
+        key = build_cache_key(self.cache_namespace, request, extra=sorted(kwargs.items()))
+
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().get(request, *args, **kwargs)
+
+        if response.status_code == 200:
+            timeout = self.cache_timeout or settings.RESPONSE_CACHE_TIMEOUT
+            cache.set(key, response.data, timeout)
+
+        return response
@@ -0,0 +1,65 @@
+from .images import image_metadata, srcset_sources
+from .models import AVAILABLE, Product, ProductCard, ProductImage, ProductVariant
+
+GALLERY_SIZE = 3
+
+SIZE_ORDER = {
+    ProductVariant.Sizes.XXS: 0, ProductVariant.Sizes.XS: 1,
+    ProductVariant.Sizes.S: 2, ProductVariant.Sizes.M: 3,
+    ProductVariant.Sizes.L: 4, ProductVariant.Sizes.XL: 5,
+    ProductVariant.Sizes.XXL: 6, ProductVariant.Sizes.UNI: 7,
+}
+
+
+def collect_card(images, variants):
+    """
+    Данные карточки товара из фото галереи и вариантов.
+    images: iterable из (id, url, srcset, meta) в порядке вывода,
+    srcset — из srcset_sources(), meta — из image_metadata()
+    variants: iterable из (color_name, color_hex, size, доступный остаток)
+    """
+    colors = {}
+    sizes = set()
+
+    for color_name, color_hex, size, available in variants:
+        colors.setdefault(color_hex, color_name)
+        if available > 0:
+            sizes.add(size)
+
+    return {
+        "gallery": [
+            {"id": image_id, "image": url, "srcset": srcset, "meta": meta}
+            for image_id, url, srcset, meta in list(images)[:GALLERY_SIZE]
+        ],
+        "colors": [
+            {"name": name, "hex": hex_code}
+            for hex_code, name in colors.items()
+        ],
+        "sizes": sorted(sizes, key=lambda size: SIZE_ORDER.get(size, 99)),
+        "in_stock": bool(sizes),
+    }
+
+
+def refresh_product_card(product_id):
+    if not Product.objects.filter(pk=product_id).exists():
+        return
+
+    images = (
+        (
+            image.id,
+            image.image.url,
+            srcset_sources(image.image, image.derivatives),
+            image_metadata(image, 'image'),
+        )
+        for image in ProductImage.objects.filter(product_id=product_id).order_by('order', 'id')[:GALLERY_SIZE]
+        if image.image
+    )
+    variants = ProductVariant.objects.filter(
+        product_id=product_id
+    ).values_list("color_name", "color_hex", "size", AVAILABLE)
+
+    ProductCard.objects.update_or_create(
+        product_id=product_id,
+        defaults=collect_card(images, variants),
+    )
+
@@ -0,0 +1,113 @@
+from decimal import Decimal
+
+from django.db import connection
+
+from .models import Product, ProductFacet, ProductVariant
+
+
+def collect_variant_facets(variants):
+    """
+    Строит значения фасета из вариантов товара.
+    variants: iterable из (size, color_name, color_hex)
+    """
+    sizes = set()
+    colors = {}
+
+    for size, color_name, color_hex in variants:
+        sizes.add(size)
+        colors.setdefault((color_name, color_hex), None)
+
+    return {
+        "sizes": sorted(sizes),
+        "colors": [[name, hex_code] for name, hex_code in colors],
+    }
+
+
+def refresh_product_facet(product_id):
+    if not Product.objects.filter(pk=product_id).exists():
+        return
+
+    variants = ProductVariant.objects.filter(
+        product_id=product_id
+    ).values_list("size", "color_name", "color_hex")
+
+    ProductFacet.objects.update_or_create(
+        product_id=product_id,
+        defaults=collect_variant_facets(variants),
+    )
+
+
+def facets_query(queryset, price_field="price_rub"):
+    """
+    SQL подсчёта фильтров по отфильтрованным товарам: размеры и цвета из
+    ProductFacet разворачиваются и группируются в PostgreSQL, диапазон цен —
+    MIN/MAX. Отфильтрованные товары читаются один раз (CTE), из базы
+    возвращаются только значения фильтров.
+    Строки: (вид, значение, второе значение, количество).
+    """
+    matched_sql, params = (
+        queryset.select_related(None).prefetch_related(None).order_by()
+        .values_list("facet__sizes", "facet__colors", price_field)
+        .query.sql_with_params()
+    )
+
+    # Наборы размеров и цветов у товаров повторяются: сначала товары
+    # группируются по набору, разворачиваются уже только разные наборы.
+    # SUM от COUNT в PostgreSQL — numeric, количество приводится к целому
+    sql = f"""
+        WITH matched (sizes, colors, price) AS ({matched_sql}),
+        size_sets AS (SELECT sizes, COUNT(*) AS products FROM matched GROUP BY sizes),
+        color_sets AS (SELECT colors, COUNT(*) AS products FROM matched GROUP BY colors)
+        SELECT 'size', size.value, NULL, SUM(products)::bigint
+        FROM size_sets CROSS JOIN LATERAL jsonb_array_elements_text(size_sets.sizes) AS size(value)
+        GROUP BY size.value
+        UNION ALL
+        SELECT 'color', color.value ->> 0, color.value ->> 1, SUM(products)::bigint
+        FROM color_sets CROSS JOIN LATERAL jsonb_array_elements(color_sets.colors) AS color(value)
+        GROUP BY 2, 3
+        UNION ALL
+        SELECT 'price', MIN(price)::text, MAX(price)::text, COUNT(*)
+        FROM matched
+    """
+    return sql, params
+
+
+def build_facets(queryset, price_field="price_rub"):
+    """
+    Собирает фильтры (размеры, цвета, диапазон цен и количество товаров
+    по каждому значению) одним агрегирующим запросом, см. facets_query.
+    """
+    size_counts = {}
+    color_counts = {}
+    price_min = None
+    price_max = None
+
+    with connection.cursor() as cursor:
+        cursor.execute(*facets_query(queryset, price_field))
+
+        for kind, value, extra, count in cursor.fetchall():
+            if kind == "size":
+                size_counts[value] = count
+            elif kind == "color":
+                color_counts[(value, extra)] = count
+            elif value is not None:
+                price_min, price_max = Decimal(value), Decimal(extra)
+
+    colors = sorted(color_counts)
+
+    return {
+        "sizes": sorted(size_counts),
+        "colors": [
+            {"color_name": name, "color_hex": hex_code}
+            for name, hex_code in colors
+        ],
+        "size_counts": dict(sorted(size_counts.items())),
+        "color_counts": [
+            {"color_name": name, "color_hex": hex_code, "count": color_counts[(name, hex_code)]}
+            for name, hex_code in colors
+        ],
+        "price": {
+            "min": price_min,
+            "max": price_max,
+        },
+    }
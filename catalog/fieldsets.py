@@ -0,0 +1,83 @@
+def parse_fieldset(value):
+    """
+    Разбирает значение ?fields= / ?omit=:
+    'id,name,products.id' -> ({'id', 'name'}, {'products': {'id'}}),
+    то есть поля верхнего уровня и поля вложенных карточек.
+    """
+    top = set()
+    nested = {}
+
+    for item in (value or "").split(","):
+        name, _, child = item.strip().partition(".")
+        if not name:
+            continue
+        if child:
+            nested.setdefault(name, set()).add(child)
+        else:
+            top.add(name)
+
+    return top, nested
+
+
+class SparseFieldsMixin:
+    """
+    Сериализатор с выбором полей: fields='id,name' оставляет только эти
+    поля, omit='description' убирает перечисленные. Поля вложенных карточек
+    задаются через точку (products.id), см. nested_fieldset().
+    """
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fieldset = (fields, omit)
+
+        selected = self.selected_fields(fields, omit)
+        for name in set(self.fields) - selected:
+            self.fields.pop(name)
+
+    @classmethod
+    def selected_fields(cls, fields=None, omit=None):
+        selected = set(cls.Meta.fields)
+
+        if fields:
+            top, nested = parse_fieldset(fields)
+            selected &= top | set(nested)
+
+        if omit:
+            selected -= parse_fieldset(omit)[0]
+
+        return selected
+
+    def nested_fieldset(self, name):
+        """fields/omit для вложенного сериализатора поля name."""
+        fieldset = {}
+
+        for key, value in zip(("fields", "omit"), self._fieldset):
+            names = parse_fieldset(value)[1].get(name)
+            if names:
+                fieldset[key] = ",".join(sorted(names))
+
+        return fieldset
+
+
+class SparseFieldsViewMixin:
+    """
+    Передаёт ?fields= / ?omit= сериализатору. get_selected_fields()
+    позволяет представлению не выбирать данные для скрытых полей.
+    """
+
+    def get_fieldset(self):
+        params = self.request.query_params
+        return {"fields": params.get("fields"), "omit": params.get("omit")}
+
+    def get_selected_fields(self):
+        """Поля ответа или None, если выбор полей не запрошен."""
+        fieldset = self.get_fieldset()
+        if not any(fieldset.values()):
+            return None
+        return self.get_serializer_class().selected_fields(**fieldset)
+
+    def is_omitted(self, name):
+        return name in parse_fieldset(self.request.query_params.get("omit"))[0]
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, **self.get_fieldset(), **kwargs)
@@ -0,0 +1,448 @@
+import base64
+import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import connection, transaction
+from django.utils.deconstruct import deconstructible
+from PIL import Image, ImageOps, features
+
+from .cache import CATALOG_NAMESPACE, bump_cache_version
+
+logger = logging.getLogger(__name__)
+
+# Ширина производных: превью в админке и заказах, карточка, полный размер
+DERIVATIVE_WIDTHS = {
+    "thumb": 160,
+    "card": 600,
+    "full": 1600,
+}
+# Формат производных по расширению: (формат Pillow, параметры сохранения)
+SAVE_FORMATS = {
+    "avif": ("AVIF", {"quality": 60}),
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+    "jpg": ("JPEG", {"quality": 85, "optimize": True}),
+    "png": ("PNG", {"optimize": True}),
+}
+# Исходный формат сохраняется как есть, остальные переводятся в JPEG
+ORIGINAL_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+# AVIF — только если Pillow собран с libavif
+MODERN_FORMATS = ("avif", "webp") if features.check("avif") else ("webp",)
+
+# Плейсхолдер (LQIP): крошечный WebP в data URI, растягивается с размытием
+PLACEHOLDER_SIZE = 16
+METADATA_KEYS = ("width", "height", "size", "hash", "placeholder")
+HASH_LENGTH = 64
+
+_executor = None
+
+
+def derivative_name(name, label, ext):
+    """products/main/abc.jpg -> products/main/derivatives/abc_thumb.webp"""
+    folder, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(folder, "derivatives", f"{stem}_{label}.{ext}")
+
+
+def _save(image, name, ext):
+    image_format, options = SAVE_FORMATS[ext]
+    if image_format == "JPEG":
+        image = image.convert("RGB")
+
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+
+    # Имена детерминированы, поэтому старый файл заменяется
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def render_derivatives(name):
+    """
+    Создаёт уменьшенные копии изображения: AVIF, WebP и исходный формат
+    для каждой ширины из DERIVATIVE_WIDTHS (не больше ширины оригинала).
+    Выполняется в отдельном процессе, к базе не обращается.
+    Возвращает {"name": исходный файл, "avif": [[url, ширина], ...],
+    "webp": [...], "original": [...], "files": [имена созданных файлов]}.
+    """
+    with default_storage.open(name) as file:
+        source = Image.open(file)
+        original_ext = ORIGINAL_EXTENSIONS.get(source.format, "jpg")
+        source = ImageOps.exif_transpose(source)
+        source.load()
+
+    if source.mode not in ("RGB", "RGBA"):
+        source = source.convert("RGBA" if "transparency" in source.info else "RGB")
+
+    sources = {ext: [] for ext in (*MODERN_FORMATS, original_ext)}
+    files = []
+
+    for label, width in DERIVATIVE_WIDTHS.items():
+        width = min(width, source.width)
+        # Для небольших оригиналов крупные размеры совпадают, они не дублируются
+        if sources["webp"] and sources["webp"][-1][1] >= width:
+            continue
+
+        image = source.copy()
+        image.thumbnail((width, source.height), Image.LANCZOS)
+
+        for ext, urls in sources.items():
+            saved = _save(image, derivative_name(name, label, ext), ext)
+            files.append(saved)
+            urls.append([default_storage.url(saved), image.width])
+
+    return {
+        "name": name,
+        **{ext: sources[ext] for ext in MODERN_FORMATS},
+        "original": sources[original_ext],
+        "files": files,
+    }
+
+
+def content_hash(file):
+    """SHA-256 содержимого файла (загруженного или открытого из хранилища)."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible(path="catalog.images.ContentAddressedStorage")
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище изображений каталога: имя файла — SHA-256 содержимого
+    (папку и расширение задаёт upload_to). Повторная загрузка того же фото
+    не создаёт копию, а возвращает уже сохранённый файл, поэтому один файл
+    может принадлежать нескольким строкам — удаляет его release_image().
+    """
+
+    def save(self, name, content, max_length=None):
+        folder, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        name = os.path.join(folder, content_hash(content) + ext)
+
+        # До конца транзакции загрузки release_image() не удалит этот файл
+        lock_file_name(name)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def lock_file_name(name):
+    """
+    Блокировка имени файла до конца текущей транзакции (advisory lock
+    PostgreSQL): загрузка того же содержимого и удаление файла ждут друг
+    друга, а не пересекаются. Вне транзакции блокировка снимается сразу.
+    """
+    key = int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "big", signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [key])
+
+
+def read_image_metadata(file):
+    """
+    Размеры (с учётом EXIF-поворота), размер в байтах, SHA-256 содержимого
+    и плейсхолдер изображения. file — загруженный или открытый из хранилища файл.
+    """
+    digest = content_hash(file)
+
+    image = Image.open(file)
+    width, height = image.size
+    if image.getexif().get(0x0112) in (5, 6, 7, 8):
+        width, height = height, width
+
+    # Для JPEG декодируется сразу уменьшенная копия
+    image.draft("RGB", (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+
+    buffer = BytesIO()
+    image.save(buffer, "WEBP", quality=30)
+    file.seek(0)
+
+    return {
+        "width": width,
+        "height": height,
+        "size": file.size,
+        "hash": digest,
+        "placeholder": "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode(),
+    }
+
+
+def read_stored_metadata(name):
+    """read_image_metadata для файла из хранилища (для пула процессов)."""
+    with default_storage.open(name) as file:
+        return {"name": name, **read_image_metadata(file)}
+
+
+def set_image_metadata(instance, field_name, metadata):
+    """Поля <поле>_width, <поле>_height и т.д. рядом с полем изображения."""
+    for key in METADATA_KEYS:
+        setattr(instance, f"{field_name}_{key}", metadata[key] if metadata else None)
+
+
+def has_current_metadata(instance, field_name):
+    """
+    Относятся ли сохранённые метаданные к текущему файлу поля. Имя файла
+    из ContentAddressedStorage — хэш содержимого, поэтому замену файла
+    через FieldFile.save() видно по несовпадению с <поле>_hash.
+    """
+    if getattr(instance, f"{field_name}_width") is None:
+        return False
+
+    stem = os.path.splitext(os.path.basename(getattr(instance, field_name).name))[0]
+    if len(stem) != HASH_LENGTH:
+        # Файлы, загруженные до перехода на хэш в имени
+        return True
+    return stem == getattr(instance, f"{field_name}_hash")
+
+
+def update_image_metadata(instance, field_name):
+    """
+    Вызывается перед сохранением модели: для только что загруженного файла
+    метаданные считаются из загрузки, для уже сохранённого (FieldFile.save())
+    без метаданных — один раз из хранилища. Массово существующие файлы
+    обрабатывает команда build_image_metadata.
+    """
+    file_field = getattr(instance, field_name)
+
+    if not file_field:
+        set_image_metadata(instance, field_name, None)
+        return
+    if file_field._committed and has_current_metadata(instance, field_name):
+        return
+
+    try:
+        if file_field._committed:
+            metadata = read_stored_metadata(file_field.name)
+        else:
+            metadata = read_image_metadata(file_field.file)
+    except (OSError, ValueError):
+        logger.warning("Не удалось прочитать изображение %s", file_field.name, exc_info=True)
+        metadata = None
+
+    set_image_metadata(instance, field_name, metadata)
+
+
+def image_metadata(instance, field_name):
+    """Сохранённые метаданные изображения или None, если их ещё нет."""
+    if not getattr(instance, field_name) or getattr(instance, f"{field_name}_width") is None:
+        return None
+    return {key: getattr(instance, f"{field_name}_{key}") for key in METADATA_KEYS}
+
+
+def delete_derivatives(derivatives):
+    for name in (derivatives or {}).get("files", []):
+        try:
+            default_storage.delete(name)
+        except Exception:
+            pass
+
+
+def is_referenced(name):
+    """Ссылается ли на файл хоть одно поле изображения каталога."""
+    from .models import IMAGE_FIELDS
+
+    return any(
+        model.objects.filter(**{field_name: name}).exists()
+        for model, field_name, _ in IMAGE_FIELDS
+    )
+
+
+def release_image(file_field, derivatives):
+    """
+    После коммита удаляет файл и его производные, если на файл больше
+    не ссылается ни одна строка: одинаковые загрузки делят один файл.
+
+    Проверка ссылок и удаление идут под lock_file_name(), которую держит
+    и загрузка того же содержимого до своего коммита: новая ссылка либо
+    уже видна проверке, либо загрузка дождётся удаления и запишет файл
+    заново. Остаётся окно для загрузок вне транзакции (блокировка
+    снимается сразу после записи файла, до сохранения строки) — админка
+    сохраняет изображения в транзакции.
+    """
+    name = getattr(file_field, "name", file_field)
+    if not name:
+        return
+
+    def delete():
+        with transaction.atomic():
+            lock_file_name(name)
+            if is_referenced(name):
+                return
+            try:
+                default_storage.delete(name)
+            except Exception:
+                pass
+            # Устаревшие производные могут принадлежать другому файлу
+            if not is_stale(name, derivatives):
+                delete_derivatives(derivatives)
+
+    transaction.on_commit(delete)
+
+
+def find_derivatives(name):
+    """Готовые производные файла у другой строки, которая на него ссылается."""
+    from .models import IMAGE_FIELDS
+
+    for model, field_name, derivatives_field in IMAGE_FIELDS:
+        for derivatives in model.objects.filter(**{field_name: name}).values_list(derivatives_field, flat=True):
+            if not is_stale(name, derivatives):
+                return derivatives
+    return None
+
+
+def is_stale(file_field, derivatives):
+    """
+    Нужно ли (пере)создать производные для текущего файла поля.
+    file_field — FieldFile или имя файла в хранилище.
+    """
+    name = getattr(file_field, "name", file_field)
+    return bool(name) and (derivatives or {}).get("name") != name
+
+
+def srcset_sources(file_field, derivatives):
+    """
+    URL и ширины производных текущего файла поля: {"avif": [[url, ширина], ...],
+    "webp": [...], "original": [...]} или None, пока они не созданы.
+    """
+    if not file_field or is_stale(file_field, derivatives):
+        return None
+    return {
+        key: derivatives[key]
+        for key in ("avif", "webp", "original")
+        if key in derivatives
+    }
+
+
+def thumbnail_url(file_field, derivatives):
+    """URL маленькой копии (для админки), иначе — оригинала."""
+    if not file_field:
+        return None
+
+    sources = srcset_sources(file_field, derivatives)
+    if sources:
+        return sources["webp"][0][0]
+    return default_storage.url(getattr(file_field, "name", file_field))
+
+
+# ---------- Фоновая обработка ----------
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def process_pool(max_workers):
+    """
+    Пул процессов обработки изображений. Запуск через spawn, а не fork:
+    процессы многопоточные (веб-сервер, поток проверки заказов), и fork
+    копирует захваченные другими потоками блокировки и соединения с БД.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+    )
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = process_pool(settings.IMAGE_WORKERS)
+    return _executor
+
+
+def save_derivatives(model, pk, field_name, derivatives_field, derivatives):
+    """
+    Сохраняет результат в строку, только если поле всё ещё указывает на тот
+    же файл (пока шла обработка, фото могли заменить).
+    update() не вызывает сигналы, поэтому карточка и кэш обновляются здесь.
+    """
+    name = derivatives["name"]
+    updated = model.objects.filter(
+        pk=pk, **{field_name: name}
+    ).update(**{derivatives_field: derivatives})
+
+    if not updated:
+        # Имена производных — от хэша файла: пока на файл ссылается другая
+        # строка, это и её производные. Проверка та же, что в release_image
+        with transaction.atomic():
+            lock_file_name(name)
+            if not is_referenced(name):
+                delete_derivatives(derivatives)
+        return
+
+    _refresh_after_update(model, pk)
+
+
+def save_metadata(model, pk, field_name, metadata):
+    """Как save_derivatives, но для метаданных из read_stored_metadata()."""
+    updated = model.objects.filter(
+        pk=pk, **{field_name: metadata["name"]}
+    ).update(**{f"{field_name}_{key}": metadata[key] for key in METADATA_KEYS})
+
+    if updated:
+        _refresh_after_update(model, pk)
+
+
+def _refresh_after_update(model, pk):
+    # models импортирует этот модуль (превью в админке)
+    from .cards import refresh_product_card
+    from .models import Product, ProductImage
+
+    if model is ProductImage:
+        refresh_product_card(model.objects.filter(pk=pk).values_list("product_id", flat=True).first())
+    elif model is Product:
+        refresh_product_card(pk)
+
+    bump_cache_version(CATALOG_NAMESPACE)
+
+
+def _on_done(model, pk, field_name, derivatives_field):
+    def callback(future):
+        try:
+            save_derivatives(model, pk, field_name, derivatives_field, future.result())
+        except Exception:
+            logger.exception("Не удалось создать производные %s #%s", model.__name__, pk)
+        finally:
+            # Колбэк выполняется в служебном потоке пула
+            connection.close()
+
+    return callback
+
+
+def schedule_derivatives(instance, field_name, derivatives_field):
+    """
+    После коммита отправляет изображение поля в пул процессов, если нужно.
+    Если тот же файл уже загружен в другую строку, её производные копируются.
+    """
+    file_field = getattr(instance, field_name)
+    if not is_stale(file_field, getattr(instance, derivatives_field)):
+        return
+
+    model, pk, name = type(instance), instance.pk, file_field.name
+
+    derivatives = find_derivatives(name)
+    if derivatives is not None:
+        setattr(instance, derivatives_field, derivatives)
+        model.objects.filter(pk=pk).update(**{derivatives_field: derivatives})
+        return
+
+    def submit():
+        future = get_executor().submit(render_derivatives, name)
+        future.add_done_callback(_on_done(model, pk, field_name, derivatives_field))
+
+    transaction.on_commit(submit)
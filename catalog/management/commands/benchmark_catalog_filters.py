@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog.models import Product
+from catalog.queries import ProductQuery
+from catalog.seeding import Rollback, seed_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнить план и время запроса списка товаров: фильтр по вариантам "
+        "через JOIN + DISTINCT и через EXISTS (ProductQuery). "
+        "Данные создаются во временной транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--subcategories", type=int, default=20)
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options["products"], options["subcategories"])
+                self.compare(options["runs"])
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Тестовые данные откачены")
+
+    def seed(self, products_count, subcategories_count):
+        started = time.perf_counter()
+        subcategories = seed_catalog(products_count, subcategories_count)
+
+        self.stdout.write(
+            f"Создано товаров: {products_count} за {time.perf_counter() - started:.1f} с"
+        )
+        self.subcategory_id = subcategories[0].id
+
+    def legacy_queryset(self, sizes, colors):
+        qs = Product.objects.filter(is_visible=True, subcategory_id=self.subcategory_id)
+        qs = qs.filter(variants__size__in=sizes)
+        qs = qs.filter(variants__color_name__in=colors)
+        return qs.distinct().order_by("-created_at", "-id")
+
+    def builder_queryset(self, sizes, colors):
+        return (
+            ProductQuery()
+            .subcategory(self.subcategory_id)
+            .variants(sizes, colors)
+            .order_by("-created_at")
+            .queryset
+        )
+
+    def compare(self, runs):
+        sizes = ["S", "M"]
+        colors = ["Черный", "Белый"]
+
+        for title, queryset in (
+            ("JOIN + DISTINCT", self.legacy_queryset(sizes, colors)),
+            ("EXISTS (ProductQuery)", self.builder_queryset(sizes, colors)),
+        ):
+            page = queryset[:16]
+            timings = []
+
+            for _ in range(runs):
+                started = time.perf_counter()
+                list(page)
+                queryset.count()
+                timings.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{title}"))
+            self.stdout.write(page.explain(analyze=True))
+            self.stdout.write(
+                f"Страница + COUNT: мин {min(timings):.1f} мс, "
+                f"среднее {sum(timings) / len(timings):.1f} мс"
+            )
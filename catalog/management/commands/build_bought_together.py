@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from catalog.bought_together import ORDERS_CHUNK, TOP_K, build_bought_together
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитать рекомендации «покупают вместе» по оплаченным заказам. "
+        "Обрабатываются только новые заказы с прошлого запуска, "
+        "--rebuild — пересчёт с нуля. Удобно запускать по расписанию (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true")
+        parser.add_argument("--chunk-size", type=int, default=ORDERS_CHUNK)
+        parser.add_argument("--top-k", type=int, default=TOP_K)
+
+    def handle(self, *args, **options):
+        baskets, products = build_bought_together(
+            rebuild=options["rebuild"],
+            orders_chunk=options["chunk_size"],
+            top_k=options["top_k"],
+            log=self.stdout.write if options["verbosity"] > 1 else None,
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обработано заказов: {baskets}, обновлено товаров: {products}"
+            )
+        )
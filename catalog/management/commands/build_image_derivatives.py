@@ -0,0 +1,63 @@
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from catalog.images import is_stale, process_pool, render_derivatives, save_derivatives
+from catalog.models import IMAGE_FIELDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Создать уменьшенные копии (AVIF, если Pillow собран с libavif, "
+        "WebP и исходный формат) для уже загруженных изображений товаров, "
+        "галерей и обложек подкатегорий"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.IMAGE_WORKERS)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Пересоздать производные даже для обработанных изображений",
+        )
+
+    def handle(self, *args, **options):
+        jobs = []
+
+        for model, field_name, derivatives_field in IMAGE_FIELDS:
+            rows = model.objects.exclude(**{field_name: ""}).exclude(
+                **{f"{field_name}__isnull": True}
+            ).values_list("pk", field_name, derivatives_field)
+
+            jobs += [
+                (model, pk, name, field_name, derivatives_field)
+                for pk, name, derivatives in rows.iterator()
+                if options["force"] or is_stale(name, derivatives)
+            ]
+
+        self.stdout.write(f"Изображений к обработке: {len(jobs)}")
+
+        done = failed = 0
+
+        with process_pool(options["workers"]) as pool:
+            futures = {
+                pool.submit(render_derivatives, name): (model, pk, name, field_name, derivatives_field)
+                for model, pk, name, field_name, derivatives_field in jobs
+            }
+
+            for future in as_completed(futures):
+                model, pk, name, field_name, derivatives_field = futures[future]
+
+                try:
+                    save_derivatives(model, pk, field_name, derivatives_field, future.result())
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} #{pk} ({name}): {e}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово: {done}, с ошибками: {failed}"
+            )
+        )
@@ -0,0 +1,64 @@
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from catalog.images import process_pool, read_stored_metadata, save_metadata
+from catalog.models import IMAGE_FIELDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Посчитать размеры, размер файла, SHA-256 и плейсхолдер для уже "
+        "загруженных изображений товаров, галерей и обложек подкатегорий"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.IMAGE_WORKERS)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Пересчитать метаданные и для уже обработанных изображений",
+        )
+
+    def handle(self, *args, **options):
+        jobs = []
+
+        for model, field_name, _ in IMAGE_FIELDS:
+            rows = model.objects.exclude(
+                Q(**{field_name: ""}) | Q(**{f"{field_name}__isnull": True})
+            )
+            if not options["force"]:
+                rows = rows.filter(**{f"{field_name}_width__isnull": True})
+
+            jobs += [
+                (model, pk, name, field_name)
+                for pk, name in rows.values_list("pk", field_name).iterator()
+            ]
+
+        self.stdout.write(f"Изображений к обработке: {len(jobs)}")
+
+        done = failed = 0
+
+        with process_pool(options["workers"]) as pool:
+            futures = {
+                pool.submit(read_stored_metadata, name): (model, pk, name, field_name)
+                for model, pk, name, field_name in jobs
+            }
+
+            for future in as_completed(futures):
+                model, pk, name, field_name = futures[future]
+
+                try:
+                    save_metadata(model, pk, field_name, future.result())
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} #{pk} ({name}): {e}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово: {done}, с ошибками: {failed}"
+            )
+        )
@@ -0,0 +1,175 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from catalog.facets import facets_query
+from catalog.models import Product, ProductVariant, SubCategory
+from catalog.queries import ProductQuery
+from catalog.seeding import MATERIALS, Rollback, seed_catalog
+
+# Планы зависят от размера таблиц: на маленьком каталоге планировщику
+# дешевле прочитать таблицу целиком (на ~30 тыс. товаров «Фасеты
+# подкатегории» уже идут Seq Scan), поэтому проверка имеет смысл только
+# на объёме не меньше боевого
+MIN_PRODUCTS = 100_000
+
+CHECKED_TABLES = {
+    Product._meta.db_table,
+    ProductVariant._meta.db_table,
+}
+
+
+def find_seq_scans(plan):
+    """Возвращает таблицы из CHECKED_TABLES, которые читаются Seq Scan."""
+    found = []
+
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in CHECKED_TABLES:
+        found.append(plan["Relation Name"])
+
+    for child in plan.get("Plans", ()):
+        found += find_seq_scans(child)
+
+    return found
+
+
+def explain(query, analyze=False):
+    """План запроса (sql, params) в формате JSON; analyze — с выполнением."""
+    sql, params = query
+    options = "ANALYZE, FORMAT JSON" if analyze else "FORMAT JSON"
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN ({options}) {sql}", params)
+        result = cursor.fetchone()[0]
+
+    return (json.loads(result) if isinstance(result, str) else result)[0]
+
+
+def as_query(queryset):
+    return queryset.query.sql_with_params()
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверить планы запросов каталога (списки, поиск, фасеты) на "
+        "синтетических данных: команда завершается ошибкой, если какой-либо "
+        "запрос читает товары или варианты последовательным сканированием. "
+        "Фасеты всего каталога неизбежно читают все товары — для них "
+        "проверяется время выполнения. Планы зависят от размера таблиц, "
+        f"на каталоге меньше {MIN_PRODUCTS} товаров Seq Scan ожидаем. "
+        "Данные создаются во временной транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=MIN_PRODUCTS)
+        parser.add_argument("--subcategories", type=int, default=40)
+        parser.add_argument("--facets-budget-ms", type=float, default=500)
+        parser.add_argument("--verbose-plans", action="store_true")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Проверка планов поддерживается только для PostgreSQL")
+
+        if options["products"] < MIN_PRODUCTS:
+            self.stdout.write(self.style.WARNING(
+                f"Товаров меньше {MIN_PRODUCTS}: планировщик может выбрать Seq Scan "
+                f"из-за размера таблиц, результат не показателен"
+            ))
+
+        failures = []
+
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                subcategories = seed_catalog(options["products"], options["subcategories"])
+                self.stdout.write(
+                    f"Создано товаров: {options['products']} за {time.perf_counter() - started:.1f} с"
+                )
+
+                for title, query in self.get_cases(subcategories):
+                    seq_scans = find_seq_scans(explain(query)["Plan"])
+
+                    if seq_scans:
+                        failures.append(title)
+                        self.stdout.write(self.style.ERROR(
+                            f"FAIL {title}: Seq Scan по {', '.join(sorted(set(seq_scans)))}"
+                        ))
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f"OK   {title}"))
+
+                    if seq_scans or options["verbose_plans"]:
+                        self.stdout.write(json.dumps(explain(query), indent=2, ensure_ascii=False))
+
+                for title, query in self.get_timed_cases():
+                    if not self.check_time(title, query, options["facets_budget_ms"], options["verbose_plans"]):
+                        failures.append(title)
+
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f"Не прошли проверку запросов: {len(failures)}")
+
+    def check_time(self, title, query, budget_ms, verbose):
+        # Первый запуск прогревает кэш страниц, замеряется второй
+        explain(query, analyze=True)
+        result = explain(query, analyze=True)
+        elapsed = result["Execution Time"]
+
+        ok = elapsed <= budget_ms
+        line = f"{title}: {elapsed:.0f} / {budget_ms:.0f} мс"
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f"OK   {line}"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAIL {line}"))
+
+        if not ok or verbose:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+
+        return ok
+
+    def get_cases(self, subcategories):
+        subcategory = subcategories[0]
+        material = SubCategory(name=MATERIALS[0], category=subcategory.category)
+
+        def page(queryset):
+            return as_query(queryset[:16])
+
+        sized = {"sizes": ["S", "M"], "colors": ["Черный"]}
+
+        return [
+            ("Все товары, новинки", page(listing())),
+            ("Все товары, цена RUB", page(listing("price_rub"))),
+            ("Все товары, цена KZT", page(listing("-price_kzt"))),
+            ("Все товары, цена BYN", page(listing("price_byn"))),
+            ("Подкатегория, новинки", page(listing(subcategory=subcategory.id))),
+            ("Подкатегория, цена RUB", page(listing("price_rub", subcategory=subcategory.id))),
+            ("Подкатегория, цена KZT", page(listing("-price_kzt", subcategory=subcategory.id))),
+            ("Подкатегория, цена BYN", page(listing("price_byn", subcategory=subcategory.id))),
+            ("Подкатегория + размер/цвет", page(listing(subcategory=subcategory.id, **sized))),
+            ("Подкатегория, COUNT", as_query(listing(subcategory=subcategory.id).order_by())),
+            ("Материал", page(listing(material=material))),
+            ("Фасеты подкатегории", facets_query(listing(subcategory=subcategory.id, **sized))),
+            # pg_trgm и индекс product_name_trgm создаёт миграция 0011
+            ("Поиск", page(listing("-rank", search="Товар 12345"))),
+            ("Фасеты поиска", facets_query(listing("-rank", search="Товар 12345"))),
+        ]
+
+    def get_timed_cases(self):
+        # Каталог без фильтров: фасеты считаются по всем товарам, и время
+        # растёт с размером каталога — из базы должны приходить только
+        # значения фильтров, а не строки товаров
+        return [
+            ("Фасеты всех товаров", facets_query(listing())),
+        ]
+
+
+def listing(sort="-created_at", **filters):
+    query = ProductQuery()
+    query.subcategory(filters.get("subcategory"))
+    query.material(filters.get("material"))
+    query.variants(filters.get("sizes"), filters.get("colors"))
+    query.search(filters.get("search"))
+    return query.order_by(sort).queryset
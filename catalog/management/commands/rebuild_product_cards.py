@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from catalog.cards import refresh_product_card
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = "Пересобрать карточки товаров (ProductCard), например после смены хранилища файлов"
+
+    def handle(self, *args, **kwargs):
+        updated = 0
+
+        for product_id in Product.objects.values_list("id", flat=True).iterator():
+            refresh_product_card(product_id)
+            updated += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обновлено карточек: {updated}"
+            )
+        )
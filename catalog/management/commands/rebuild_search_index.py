@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Пересобрать поисковый индекс товаров"
+
+    def handle(self, *args, **kwargs):
+        updated = update_search_vectors()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обновлено товаров: {updated}"
+            )
+        )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from catalog.cache import CATALOG_NAMESPACE, bump_cache_version
+from catalog.models import Product
+from catalog.similar import refresh_similar_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитать похожие товары: по умолчанию только устаревшие "
+        "и ещё не посчитанные, с --all — для всех товаров. "
+        "Удобно запускать по расписанию (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true")
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+
+        if not options["all"]:
+            products = products.filter(Q(similar__isnull=True) | Q(similar__is_stale=True))
+
+        updated = 0
+        for product_id in products.values_list("id", flat=True).iterator():
+            refresh_similar_products(product_id)
+            updated += 1
+
+        # Похожие товары входят в кэшированный ответ карточки товара:
+        # кэш сбрасывается один раз после пересчёта, а не на каждый товар
+        if updated:
+            bump_cache_version(CATALOG_NAMESPACE)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обновлено товаров: {updated}"
+            )
+        )
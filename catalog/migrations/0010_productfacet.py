@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_facets(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    ProductVariant = apps.get_model("catalog", "ProductVariant")
+    ProductFacet = apps.get_model("catalog", "ProductFacet")
+
+    facets = {
+        product_id: {"sizes": set(), "colors": {}}
+        for product_id in Product.objects.values_list("id", flat=True)
+    }
+
+    for product_id, size, color_name, color_hex in ProductVariant.objects.order_by(
+        "color_hex", "id"
+    ).values_list("product_id", "size", "color_name", "color_hex"):
+        facets[product_id]["sizes"].add(size)
+        facets[product_id]["colors"].setdefault((color_name, color_hex), None)
+
+    ProductFacet.objects.bulk_create([
+        ProductFacet(
+            product_id=product_id,
+            sizes=sorted(data["sizes"]),
+            colors=[[name, hex_code] for name, hex_code in data["colors"]],
+        )
+        for product_id, data in facets.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_remove_product_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='facet', serialize=False, to='catalog.product', verbose_name='Товар')),
+                ('sizes', models.JSONField(blank=True, default=list, verbose_name='Размеры')),
+                ('colors', models.JSONField(blank=True, default=list, verbose_name='Цвета')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Фасет товара',
+                'verbose_name_plural': 'Фасеты товаров',
+            },
+        ),
+        migrations.RunPython(fill_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:16
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F, Func, OuterRef, Subquery, TextField, Value
+
+
+def fill_search_vectors(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    SubCategory = apps.get_model("catalog", "SubCategory")
+
+    subcategory_name = Subquery(
+        SubCategory.objects.filter(pk=OuterRef("subcategory_id")).values("name")[:1]
+    )
+    description = Func(
+        F("description"), Value("<[^>]+>"), Value(" "), Value("g"),
+        function="regexp_replace",
+        output_field=TextField(),
+    )
+
+    Product.objects.update(search_vector=(
+        SearchVector("name", weight="A", config="russian")
+        + SearchVector(subcategory_name, weight="B", config="russian")
+        + SearchVector("material", weight="B", config="russian")
+        + SearchVector(description, weight="D", config="russian")
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_productfacet'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='product_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
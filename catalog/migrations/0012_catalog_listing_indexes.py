@@ -0,0 +1,50 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:21
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['gender', 'order'], name='category_gender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['-created_at', '-id'], name='product_visible_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['subcategory', '-created_at', '-id'], name='product_subcat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['price_rub', 'id'], name='product_visible_rub_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['price_kzt', 'id'], name='product_visible_kzt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['price_byn', 'id'], name='product_visible_byn_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Upper('material'), condition=models.Q(('is_visible', True)), name='product_material_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['size', 'color_name', 'product'], name='variant_size_color_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['color_name', 'product'], name='variant_color_idx'),
+        ),
+    ]
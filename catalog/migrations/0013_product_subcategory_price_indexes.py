@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_catalog_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['subcategory', 'price_rub', 'id'], name='product_subcat_rub_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['subcategory', 'price_kzt', 'id'], name='product_subcat_kzt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['subcategory', 'price_byn', 'id'], name='product_subcat_byn_idx'),
+        ),
+    ]
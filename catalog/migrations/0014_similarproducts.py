@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_product_subcategory_price_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarProducts',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similar', serialize=False, to='catalog.product', verbose_name='Товар')),
+                ('product_ids', models.JSONField(blank=True, default=list, verbose_name='Похожие товары')),
+                ('is_stale', models.BooleanField(db_index=True, default=False, verbose_name='Требует пересчёта')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Похожие товары',
+                'verbose_name_plural': 'Похожие товары',
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0014_similarproducts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoughtTogether',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='bought_together', serialize=False, to='catalog.product', verbose_name='Товар')),
+                ('product_ids', models.JSONField(blank=True, default=list, verbose_name='Покупают вместе')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Покупают вместе',
+                'verbose_name_plural': 'Покупают вместе',
+            },
+        ),
+        migrations.CreateModel(
+            name='BoughtTogetherProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_order_id', models.PositiveBigIntegerField(default=0, verbose_name='Последний заказ')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Прогресс расчёта «покупают вместе»',
+                'verbose_name_plural': 'Прогресс расчёта «покупают вместе»',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductPairCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Совместных заказов')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.product', verbose_name='Купленный вместе')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Совместная покупка',
+                'verbose_name_plural': 'Совместные покупки',
+                'indexes': [models.Index(fields=['product', '-count'], name='product_pair_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'other'), name='product_pair_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 6.0.2 on 2026-10-18 01:12
+
+import django.db.models.deletion
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+SIZE_ORDER = {"XXS": 0, "XS": 1, "S": 2, "M": 3, "L": 4, "XL": 5, "XXL": 6, "UNI": 7}
+
+
+def fill_cards(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    ProductImage = apps.get_model("catalog", "ProductImage")
+    ProductVariant = apps.get_model("catalog", "ProductVariant")
+    ProductCard = apps.get_model("catalog", "ProductCard")
+
+    cards = {
+        product_id: {"gallery": [], "colors": {}, "sizes": set()}
+        for product_id in Product.objects.values_list("id", flat=True)
+    }
+
+    for product_id, image_id, image in ProductImage.objects.order_by(
+        "product_id", "order", "id"
+    ).values_list("product_id", "id", "image"):
+        gallery = cards[product_id]["gallery"]
+        if image and len(gallery) < 3:
+            gallery.append({"id": image_id, "image": default_storage.url(image)})
+
+    for product_id, color_name, color_hex, size, stock in ProductVariant.objects.order_by(
+        "color_hex", "id"
+    ).values_list("product_id", "color_name", "color_hex", "size", "stock"):
+        cards[product_id]["colors"].setdefault(color_hex, color_name)
+        if stock > 0:
+            cards[product_id]["sizes"].add(size)
+
+    ProductCard.objects.bulk_create([
+        ProductCard(
+            product_id=product_id,
+            gallery=data["gallery"],
+            colors=[{"name": name, "hex": hex_code} for hex_code, name in data["colors"].items()],
+            sizes=sorted(data["sizes"], key=lambda size: SIZE_ORDER.get(size, 99)),
+            in_stock=bool(data["sizes"]),
+        )
+        for product_id, data in cards.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0015_bought_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='catalog.product', verbose_name='Товар')),
+                ('gallery', models.JSONField(blank=True, default=list, verbose_name='Галерея')),
+                ('colors', models.JSONField(blank=True, default=list, verbose_name='Цвета')),
+                ('sizes', models.JSONField(blank=True, default=list, verbose_name='Размеры в наличии')),
+                ('in_stock', models.BooleanField(default=False, verbose_name='Есть в наличии')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Карточка товара',
+                'verbose_name_plural': 'Карточки товаров',
+            },
+        ),
+        migrations.RunPython(fill_cards, migrations.RunPython.noop),
+    ]
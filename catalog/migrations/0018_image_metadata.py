@@ -0,0 +1,88 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0017_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='main_image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='SHA-256 главного изображения'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота главного изображения, px'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image_placeholder',
+            field=models.TextField(blank=True, editable=False, null=True, verbose_name='Плейсхолдер главного изображения'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Размер файла главного изображения, байт'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина главного изображения, px'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота, px'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, null=True, verbose_name='Плейсхолдер'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Размер файла, байт'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина, px'),
+        ),
+        migrations.AddField(
+            model_name='subcategory',
+            name='cover_image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='SHA-256 обложки'),
+        ),
+        migrations.AddField(
+            model_name='subcategory',
+            name='cover_image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота обложки, px'),
+        ),
+        migrations.AddField(
+            model_name='subcategory',
+            name='cover_image_placeholder',
+            field=models.TextField(blank=True, editable=False, null=True, verbose_name='Плейсхолдер обложки'),
+        ),
+        migrations.AddField(
+            model_name='subcategory',
+            name='cover_image_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Размер файла обложки, байт'),
+        ),
+        migrations.AddField(
+            model_name='subcategory',
+            name='cover_image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина обложки, px'),
+        ),
+    ]
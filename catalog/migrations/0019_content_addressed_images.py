@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:40
+
+import catalog.images
+import catalog.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0018_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='main_image',
+            field=models.ImageField(help_text='Главное изображение товара', null=True, storage=catalog.images.ContentAddressedStorage(), upload_to=catalog.models.product_main_image_path, validators=[catalog.models.validate_image_size], verbose_name='Главное изображение'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=catalog.images.ContentAddressedStorage(), upload_to=catalog.models.product_gallery_image_path, validators=[catalog.models.validate_image_size], verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='subcategory',
+            name='cover_image',
+            field=models.ImageField(null=True, storage=catalog.images.ContentAddressedStorage(), upload_to=catalog.models.subcategory_cover_path, validators=[catalog.models.validate_image_size], verbose_name='Обложка подкатегории'),
+        ),
+    ]
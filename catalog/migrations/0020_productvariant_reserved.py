@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0019_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Сумма активных резервов под неоплаченные заказы', verbose_name='В резерве'),
+        ),
+    ]
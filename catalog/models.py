@@ -1,30 +1,32 @@
-import uuid
 import os
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Greatest, Upper
 from django.core.validators import MinValueValidator
 from colorfield.fields import ColorField
 from django.core.exceptions import ValidationError
 from django.utils.html import format_html, mark_safe
 from tinymce.models import HTMLField
 
+from shop_config.models import SingletonModel
 
+from .images import content_storage, thumbnail_url
+
+
+# Задают только папку: имя файла заменяет content_storage на SHA-256
+# содержимого, от исходного имени остаётся расширение
 def product_main_image_path(instance, filename):
-    ext = filename.split('.')[-1]
-    new_name = f'{uuid.uuid4().hex}.{ext}'
-    return os.path.join('products/main/', new_name)
+    return os.path.join('products/main/', filename)
 
 
 def product_gallery_image_path(instance, filename):
-    ext = filename.split('.')[-1]
-    new_name = f'{uuid.uuid4().hex}.{ext}'
-    return os.path.join('products/gallery/', new_name)
+    return os.path.join('products/gallery/', filename)
 
 
 def subcategory_cover_path(instance, filename):
-    ext = filename.split('.')[-1]
-    new_name = f'{uuid.uuid4().hex}.{ext}'
-    return os.path.join('subcategories/', new_name)
+    return os.path.join('subcategories/', filename)
 
 
 def validate_image_size(image):
@@ -44,6 +46,9 @@ class Category(models.Model):
 
     class Meta:
         ordering = ['order', 'gender', 'name']
+        indexes = [
+            models.Index(fields=['gender', 'order'], name='category_gender_idx'),
+        ]
         verbose_name = 'категорию'
         verbose_name_plural = 'Категории'
 
@@ -72,10 +77,19 @@ class SubCategory(models.Model):
     cover_image = models.ImageField(
         'Обложка подкатегории',
         upload_to=subcategory_cover_path,
+        storage=content_storage,
         null=True,
         blank=False,
         validators=[validate_image_size],
     )
+    cover_image_derivatives = models.JSONField(
+        'Уменьшенные копии обложки', default=dict, blank=True, editable=False
+    )
+    cover_image_width = models.PositiveIntegerField('Ширина обложки, px', null=True, blank=True, editable=False)
+    cover_image_height = models.PositiveIntegerField('Высота обложки, px', null=True, blank=True, editable=False)
+    cover_image_size = models.PositiveIntegerField('Размер файла обложки, байт', null=True, blank=True, editable=False)
+    cover_image_hash = models.CharField('SHA-256 обложки', max_length=64, blank=True, null=True, editable=False)
+    cover_image_placeholder = models.TextField('Плейсхолдер обложки', blank=True, null=True, editable=False)
     show_on_main = models.BooleanField(
         'Показывать на главной',
         default=False,
@@ -99,11 +113,6 @@ class SubCategory(models.Model):
         verbose_name = 'подкатегорию'
         verbose_name_plural = 'Подкатегории'
 
-    def delete(self, *args, **kwargs):
-        if self.cover_image:
-            self.cover_image.delete(save=False)
-        super().delete(*args, **kwargs)
-
     @property
     def material_products(self):
         if not self.is_material:
@@ -153,25 +162,79 @@ class Product(models.Model):
     main_image = models.ImageField(
         'Главное изображение',
         upload_to=product_main_image_path,
+        storage=content_storage,
         null=True,
         blank=False,
         validators=[validate_image_size],
         help_text='Главное изображение товара',
     )
+    main_image_derivatives = models.JSONField(
+        'Уменьшенные копии главного изображения', default=dict, blank=True, editable=False
+    )
+    main_image_width = models.PositiveIntegerField('Ширина главного изображения, px', null=True, blank=True, editable=False)
+    main_image_height = models.PositiveIntegerField('Высота главного изображения, px', null=True, blank=True, editable=False)
+    main_image_size = models.PositiveIntegerField('Размер файла главного изображения, байт', null=True, blank=True, editable=False)
+    main_image_hash = models.CharField('SHA-256 главного изображения', max_length=64, blank=True, null=True, editable=False)
+    main_image_placeholder = models.TextField('Плейсхолдер главного изображения', blank=True, null=True, editable=False)
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    search_vector = SearchVectorField('Поисковый индекс', null=True, editable=False)
 
     class Meta:
         ordering = ['name']
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
-
-    def delete(self, *args, **kwargs):
-        if self.main_image:
-            self.main_image.delete(save=False)
-        for img in self.images.all():
-            if img.image:
-                img.image.delete(save=False)
-        super().delete(*args, **kwargs)
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            GinIndex(fields=['name'], name='product_name_trgm', opclasses=['gin_trgm_ops']),
+            # Списки каталога: только видимые товары, сортировка по новизне/цене
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='product_visible_created_idx',
+                condition=models.Q(is_visible=True),
+            ),
+            models.Index(
+                fields=['subcategory', '-created_at', '-id'],
+                name='product_subcat_created_idx',
+                condition=models.Q(is_visible=True),
+            ),
+            models.Index(
+                fields=['price_rub', 'id'],
+                name='product_visible_rub_idx',
+                condition=models.Q(is_visible=True),
+            ),
+            models.Index(
+                fields=['price_kzt', 'id'],
+                name='product_visible_kzt_idx',
+                condition=models.Q(is_visible=True),
+            ),
+            models.Index(
+                fields=['price_byn', 'id'],
+                name='product_visible_byn_idx',
+                condition=models.Q(is_visible=True),
+            ),
+            # Сортировка по цене внутри подкатегории, по индексу на валюту
+            models.Index(
+                fields=['subcategory', 'price_rub', 'id'],
+                name='product_subcat_rub_idx',
+                condition=models.Q(is_visible=True),
+            ),
+            models.Index(
+                fields=['subcategory', 'price_kzt', 'id'],
+                name='product_subcat_kzt_idx',
+                condition=models.Q(is_visible=True),
+            ),
+            models.Index(
+                fields=['subcategory', 'price_byn', 'id'],
+                name='product_subcat_byn_idx',
+                condition=models.Q(is_visible=True),
+            ),
+            # material__iexact -> UPPER(material) = UPPER(%s)
+            models.Index(
+                Upper('material'),
+                name='product_material_upper_idx',
+                condition=models.Q(is_visible=True),
+            ),
+        ]
 
     def colors_preview(self):
         variants = self.variants.all()
@@ -204,8 +267,17 @@ class ProductImage(models.Model):
     image = models.ImageField(
         'Изображение',
         upload_to=product_gallery_image_path,
+        storage=content_storage,
         validators=[validate_image_size],
     )
+    derivatives = models.JSONField(
+        'Уменьшенные копии', default=dict, blank=True, editable=False
+    )
+    image_width = models.PositiveIntegerField('Ширина, px', null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField('Высота, px', null=True, blank=True, editable=False)
+    image_size = models.PositiveIntegerField('Размер файла, байт', null=True, blank=True, editable=False)
+    image_hash = models.CharField('SHA-256', max_length=64, blank=True, null=True, editable=False)
+    image_placeholder = models.TextField('Плейсхолдер', blank=True, null=True, editable=False)
     order = models.PositiveIntegerField('Порядок вывода', default=0)
 
     class Meta:
@@ -213,16 +285,11 @@ class ProductImage(models.Model):
         verbose_name = 'Фотография товара'
         verbose_name_plural = 'Фотографии товара'
 
-    def delete(self, *args, **kwargs):
-        if self.image:
-            self.image.delete(save=False)
-        super().delete(*args, **kwargs)
-
     def preview_image(self):
         if self.image:
             return format_html(
                 '<img src="{}" style="max-width: 150px; max-height: 150px; object-fit: cover;" />',
-                self.image.url,
+                thumbnail_url(self.image, self.derivatives),
             )
         return 'Нет изображения'
 
@@ -232,6 +299,15 @@ class ProductImage(models.Model):
         return f'{self.product.name} — {self.order}'
 
 
+# Изображения каталога: (модель, поле изображения, поле с производными).
+# Метаданные хранятся в полях <поле>_width, <поле>_height и т.д.
+IMAGE_FIELDS = [
+    (Product, 'main_image', 'main_image_derivatives'),
+    (ProductImage, 'image', 'derivatives'),
+    (SubCategory, 'cover_image', 'cover_image_derivatives'),
+]
+
+
 class ProductVariant(models.Model):
     class Sizes(models.TextChoices):
         XXS = 'XXS', 'XXS'
@@ -265,10 +341,21 @@ class ProductVariant(models.Model):
         default=0,
         validators=[MinValueValidator(0)],
     )
+    reserved = models.PositiveIntegerField(
+        'В резерве',
+        default=0,
+        editable=False,
+        help_text='Сумма активных резервов под неоплаченные заказы',
+    )
 
     class Meta:
         ordering = ['color_hex', 'id']
         unique_together = ('product', 'color_name', 'size')
+        indexes = [
+            # Фильтры и фасеты по размеру/цвету (EXISTS по вариантам)
+            models.Index(fields=['size', 'color_name', 'product'], name='variant_size_color_idx'),
+            models.Index(fields=['color_name', 'product'], name='variant_color_idx'),
+        ]
         verbose_name = 'Вариант товара'
         verbose_name_plural = 'Варианты товара'
 
@@ -295,5 +382,174 @@ class ProductVariant(models.Model):
                     'size': f'Уже есть UNI вариант! Только UNI допустим.'
                 })
 
+    def save(self, *args, **kwargs):
+        # reserved меняют только условные UPDATE из orders.reservations:
+        # сохранение из админки не должно затирать его устаревшим значением
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname != 'reserved' and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def available(self):
+        """Сколько можно купить: остаток за вычетом резерва."""
+        return max(self.stock - self.reserved, 0)
+
     def __str__(self):
         return f'{self.product.name} / {self.color_name} / {self.size}'
+
+
+# ProductVariant.available в запросах (values_list, annotate)
+AVAILABLE = Greatest(models.F('stock') - models.F('reserved'), 0)
+
+
+class ProductFacet(models.Model):
+    """
+    Предрассчитанные значения фильтров товара (размеры и цвета его вариантов).
+    Обновляется из сигналов ProductVariant/Product, см. catalog.facets.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        verbose_name='Товар',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='facet',
+    )
+    sizes = models.JSONField('Размеры', default=list, blank=True)
+    colors = models.JSONField('Цвета', default=list, blank=True)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Фасет товара'
+        verbose_name_plural = 'Фасеты товаров'
+
+    def __str__(self):
+        return f'Фасет: {self.product_id}'
+
+
+class ProductCard(models.Model):
+    """
+    Денормализованные данные карточки товара для списков: первые фото
+    галереи, уникальные цвета, размеры в наличии. Обновляется из сигналов
+    Product/ProductImage/ProductVariant, см. catalog.cards.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        verbose_name='Товар',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card',
+    )
+    gallery = models.JSONField('Галерея', default=list, blank=True)
+    colors = models.JSONField('Цвета', default=list, blank=True)
+    sizes = models.JSONField('Размеры в наличии', default=list, blank=True)
+    in_stock = models.BooleanField('Есть в наличии', default=False)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Карточка товара'
+        verbose_name_plural = 'Карточки товаров'
+
+    def __str__(self):
+        return f'Карточка: {self.product_id}'
+
+
+class SimilarProducts(models.Model):
+    """
+    Предрассчитанный список похожих товаров для карточки товара.
+    Пересчитывается из сигналов и командой refresh_similar_products,
+    см. catalog.similar.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        verbose_name='Товар',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='similar',
+    )
+    product_ids = models.JSONField('Похожие товары', default=list, blank=True)
+    is_stale = models.BooleanField('Требует пересчёта', default=False, db_index=True)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Похожие товары'
+        verbose_name_plural = 'Похожие товары'
+
+    def __str__(self):
+        return f'Похожие: {self.product_id}'
+
+
+class ProductPairCount(models.Model):
+    """
+    Разреженная матрица совместных покупок: в скольких оплаченных заказах
+    товары встречались вместе. Каждая пара хранится в обе стороны.
+    Заполняется командой build_bought_together, см. catalog.bought_together.
+    """
+
+    product = models.ForeignKey(
+        Product,
+        verbose_name='Товар',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    other = models.ForeignKey(
+        Product,
+        verbose_name='Купленный вместе',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    count = models.PositiveIntegerField('Совместных заказов', default=0)
+
+    class Meta:
+        verbose_name = 'Совместная покупка'
+        verbose_name_plural = 'Совместные покупки'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='product_pair_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-count'], name='product_pair_top_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} + {self.other_id}: {self.count}'
+
+
+class BoughtTogether(models.Model):
+    """Топ-K товаров, которые чаще всего покупают вместе с данным."""
+
+    product = models.OneToOneField(
+        Product,
+        verbose_name='Товар',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='bought_together',
+    )
+    product_ids = models.JSONField('Покупают вместе', default=list, blank=True)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Покупают вместе'
+        verbose_name_plural = 'Покупают вместе'
+
+    def __str__(self):
+        return f'Покупают вместе: {self.product_id}'
+
+
+class BoughtTogetherProgress(SingletonModel):
+    """Последний обработанный заказ для инкрементального пересчёта."""
+
+    last_order_id = models.PositiveBigIntegerField('Последний заказ', default=0)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Прогресс расчёта «покупают вместе»'
+        verbose_name_plural = 'Прогресс расчёта «покупают вместе»'
+
+    def __str__(self):
+        return f'Обработано до заказа {self.last_order_id}'
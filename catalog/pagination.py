@@ -0,0 +1,225 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ProductPagination(PageNumberPagination):
+    page_size = 16
+
+
+def with_tiebreaker(*ordering):
+    """
+    Добавляет к сортировке id в том же направлении, что и основное поле,
+    чтобы порядок товаров с одинаковой ценой/датой был однозначным.
+    """
+    fields = [field for field in ordering if field]
+    if not fields:
+        return ("-id",)
+
+    names = {field.lstrip("-") for field in fields}
+    if "id" in names or "pk" in names:
+        return tuple(fields)
+
+    tiebreaker = "-id" if fields[0].startswith("-") else "id"
+    return (*fields, tiebreaker)
+
+
+def estimate_count(queryset):
+    """
+    Приблизительное количество строк по оценке планировщика Postgres.
+    Для других СУБД возвращает None.
+    """
+    if connections[queryset.db].vendor != "postgresql":
+        return None
+
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация: следующая страница выбирается условием
+    по значениям последней строки (поле сортировки + id), без OFFSET.
+    Сортировка берётся из order_by() переданного queryset.
+
+    Параметры запроса:
+        cursor    — курсор следующей страницы из поля "next";
+        page_size — размер страницы (до max_page_size);
+        count     — "exact" (COUNT(*)) или "estimate" (оценка планировщика).
+    """
+
+    page_size = 16
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    count_query_param = "count"
+    invalid_cursor_message = "Некорректный курсор"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = with_tiebreaker(*queryset.query.order_by)
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset, request)
+
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+
+        if mode == "exact":
+            return queryset.count()
+        if mode == "estimate":
+            return estimate_count(queryset)
+
+        return None
+
+    def get_position_filter(self, position):
+        condition = Q()
+        equal = {}
+
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+
+        return condition
+
+    def get_ordering_fields(self, queryset):
+        """Поля модели (или аннотации) сортировки — для разбора курсора."""
+        fields = []
+
+        for field in self.ordering:
+            name = field.lstrip("-")
+            if name in queryset.query.annotations:
+                fields.append(queryset.query.annotations[name].output_field)
+                continue
+
+            opts = queryset.model._meta
+            *relations, name = name.split("__")
+            for relation in relations:
+                opts = opts.get_field(relation).related_model._meta
+            fields.append(opts.pk if name == "pk" else opts.get_field(name))
+
+        return fields
+
+    def get_position(self, obj):
+        return [
+            getattr(obj, field.lstrip("-"))
+            for field in self.ordering
+        ]
+
+    def encode_cursor(self, position):
+        def prepare(value):
+            if isinstance(value, (datetime, date)):
+                return value.isoformat()
+            if isinstance(value, Decimal):
+                return str(value)
+            return value
+
+        raw = json.dumps([prepare(value) for value in position])
+        return b64encode(raw.encode("utf-8"), altchars=b"-_").decode("ascii")
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            position = json.loads(b64decode(encoded.encode("ascii"), altchars=b"-_"))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # Значения приводятся к типам полей сортировки: курсор с чужими
+        # значениями (["x", 1] вместо даты и id) — это 404, а не ошибка SQL
+        try:
+            position = [
+                field.to_python(value)
+                for field, value in zip(self.get_ordering_fields(queryset), position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+
+        return position
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        cursor = self.encode_cursor(self.get_position(self.page[-1]))
+        url = remove_query_param(self.base_url, "page")
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": None,
+            "results": data,
+        })
+
+
+class ProductCursorPagination(KeysetPagination):
+    page_size = 16
+
+
+class KeysetPaginationMixin:
+    """
+    Переключает ListAPIView на курсорную пагинацию по ?pagination=cursor
+    (или при наличии ?cursor=...), иначе используется pagination_class.
+    """
+
+    keyset_pagination_class = ProductCursorPagination
+
+    def use_keyset_pagination(self):
+        params = self.request.query_params
+        return params.get("pagination") == "cursor" or "cursor" in params
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if self.use_keyset_pagination():
+                self._paginator = self.keyset_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
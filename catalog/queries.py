@@ -0,0 +1,228 @@
+from collections import defaultdict
+
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber, Upper
+
+from .models import Product, ProductVariant
+from .pagination import with_tiebreaker
+from .search import search_products
+
+SUBCATEGORY_PREVIEW_MAX = 50
+PRODUCT_BATCH_MAX = 100
+
+
+def with_product_cards(queryset, prefix=''):
+    """
+    Данные карточек товара (ProductListSerializer) из ProductCard одним
+    JOIN, без prefetch фото и вариантов.
+    prefix — путь до товара, например 'product__' для избранного.
+    """
+    return queryset.select_related(f'{prefix}card')
+
+
+CARD_FIELDS = ('gallery', 'colors', 'sizes', 'in_stock')
+
+# Поля ответа, которые собираются из нескольких колонок Product
+PRODUCT_FIELD_COLUMNS = {
+    'main_image_srcset': {'main_image', 'main_image_derivatives'},
+    'main_image_meta': {
+        'main_image',
+        'main_image_width',
+        'main_image_height',
+        'main_image_size',
+        'main_image_hash',
+        'main_image_placeholder',
+    },
+}
+
+
+def product_columns(fields):
+    """Колонки Product, нужные для полей ответа fields."""
+    concrete = {field.name for field in Product._meta.concrete_fields}
+    columns = set(fields) & concrete
+    for name in fields:
+        columns |= PRODUCT_FIELD_COLUMNS.get(name, set())
+    return columns
+
+
+def only_card_fields(queryset, fields):
+    """
+    Карточки только с полями ответа fields (?fields= / ?omit=): лишние
+    колонки Product не выбираются, а без полей ProductCard не нужен и JOIN.
+    Колонки сортировки остаются — по ним строится курсор пагинации.
+    """
+    ordering = {
+        name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str)
+    }
+    columns = {'id'} | product_columns(fields) | product_columns(ordering)
+
+    # Карточка читается целиком (см. ProductListSerializer._get_card)
+    if set(fields) & set(CARD_FIELDS):
+        queryset = queryset.select_related('card')
+        columns |= {f'card__{name}' for name in CARD_FIELDS}
+
+    return queryset.only(*columns)
+
+
+def load_product_cards(product_ids, fields=None):
+    """
+    Видимые товары по списку id одним запросом вместе с карточками: {id: товар}.
+    fields — только эти поля карточки (см. only_card_fields).
+    """
+    if not product_ids:
+        return {}
+
+    products = Product.objects.filter(id__in=set(product_ids), is_visible=True)
+    if fields is None:
+        products = with_product_cards(products)
+    else:
+        products = only_card_fields(products, fields)
+
+    return {product.id: product for product in products}
+
+
+def ordered_cards(product_ids, cards, limit):
+    """Товары из load_product_cards в порядке product_ids, скрытые пропускаются."""
+    return [cards[product_id] for product_id in product_ids if product_id in cards][:limit]
+
+
+def with_products_count(queryset):
+    """Число видимых товаров подкатегории одним запросом со списком."""
+    return queryset.annotate(
+        card_products_count=Count('products', filter=Q(products__is_visible=True))
+    )
+
+
+def attach_subcategory_products(subcategories, preview=None):
+    """
+    Проставляет подкатегориям card_products (карточки товаров) без запросов
+    на каждую строку: обычные подкатегории — одним prefetch, разделы
+    материалов — одним запросом по UPPER(material) на все разделы сразу.
+    preview=N оставляет только первые N карточек, preview=0 — только счётчики.
+    Подкатегории должны быть получены через with_products_count.
+    """
+    subcategories = list(subcategories)
+    regular = [sub for sub in subcategories if not sub.is_material]
+    materials = [sub for sub in subcategories if sub.is_material]
+
+    products = Product.objects.filter(is_visible=True).order_by('name', 'id')
+
+    if preview == 0:
+        for sub in subcategories:
+            sub.card_products = []
+    elif regular:
+        if preview is not None:
+            products_qs = products[:preview]
+        else:
+            products_qs = products
+
+        prefetch_related_objects(
+            regular,
+            Prefetch(
+                'products',
+                queryset=with_product_cards(products_qs),
+                to_attr='card_products',
+            ),
+        )
+
+    if materials:
+        _attach_material_products(materials, products, preview)
+
+    return subcategories
+
+
+def _attach_material_products(materials, products, preview):
+    # Раздел материала показывает товары всех подкатегорий с таким же
+    # материалом (SubCategory.material_products), сравнение без учёта регистра
+    keys = {sub.name.upper() for sub in materials}
+    products = products.annotate(material_key=Upper('material')).filter(material_key__in=keys)
+
+    counts = dict(
+        products.order_by().values('material_key').annotate(count=Count('id')).values_list('material_key', 'count')
+    )
+
+    for sub in materials:
+        sub.card_products_count = counts.get(sub.name.upper(), 0)
+
+    if preview == 0:
+        return
+
+    if preview is not None:
+        products = products.annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('material_key'),
+                order_by=[F('name').asc(), F('id').asc()],
+            )
+        ).filter(position__lte=preview)
+
+    grouped = defaultdict(list)
+    for product in with_product_cards(products):
+        grouped[product.material_key].append(product)
+
+    for sub in materials:
+        sub.card_products = grouped.get(sub.name.upper(), [])
+
+
+class ProductQuery:
+    """
+    Сборщик запроса списка товаров для ProductListView и ProductSearchView.
+
+    Фильтры по вариантам выполняются через коррелированный EXISTS, а не JOIN,
+    поэтому строки товаров не размножаются и DISTINCT не нужен. Размер и цвет
+    проверяются на одном и том же варианте.
+    """
+
+    def __init__(self, queryset=None):
+        if queryset is None:
+            queryset = Product.objects.filter(is_visible=True)
+        self.queryset = queryset
+
+    def subcategory(self, subcategory_id):
+        if subcategory_id:
+            self.queryset = self.queryset.filter(subcategory_id=subcategory_id)
+        return self
+
+    def material(self, material_subcategory):
+        # Товары с названием материала и того же пола, что и раздел материала
+        if material_subcategory is not None:
+            self.queryset = self.queryset.filter(
+                material__iexact=material_subcategory.name,
+                subcategory__category__gender=material_subcategory.category.gender,
+            )
+        return self
+
+    def variants(self, sizes=None, colors=None):
+        if not sizes and not colors:
+            return self
+
+        variants = ProductVariant.objects.filter(product=OuterRef('pk'))
+
+        if sizes:
+            variants = variants.filter(size__in=sizes)
+        if colors:
+            variants = variants.filter(color_name__in=colors)
+
+        self.queryset = self.queryset.filter(Exists(variants))
+        return self
+
+    def price_range(self, price_field, price_min=None, price_max=None):
+        if price_min:
+            self.queryset = self.queryset.filter(**{f'{price_field}__gte': price_min})
+        if price_max:
+            self.queryset = self.queryset.filter(**{f'{price_field}__lte': price_max})
+        return self
+
+    def search(self, query):
+        if query:
+            self.queryset = search_products(self.queryset, query)
+        return self
+
+    def order_by(self, field):
+        self.queryset = self.queryset.order_by(*with_tiebreaker(field))
+        return self
+
+    def cards(self, fields=None):
+        if fields is None:
+            return with_product_cards(self.queryset)
+        return only_card_fields(self.queryset, fields)
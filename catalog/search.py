@@ -0,0 +1,63 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db.models import F, FloatField, Func, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Cast
+
+from .models import Product, SubCategory
+
+SEARCH_CONFIG = 'russian'
+
+
+def search_vector_expression():
+    """
+    Поисковый вектор товара: название (A), подкатегория и материал (B),
+    описание без HTML-тегов (D). Считается целиком в SQL, поэтому может
+    обновлять любое количество товаров одним UPDATE.
+    """
+    subcategory_name = Subquery(
+        SubCategory.objects.filter(pk=OuterRef('subcategory_id')).values('name')[:1]
+    )
+    description = Func(
+        F('description'),
+        Value('<[^>]+>'),
+        Value(' '),
+        Value('g'),
+        function='regexp_replace',
+        output_field=TextField(),
+    )
+
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(subcategory_name, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('material', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(description, weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset=None):
+    if queryset is None:
+        queryset = Product.objects.all()
+
+    return queryset.order_by().update(search_vector=search_vector_expression())
+
+
+def search_products(queryset, query):
+    """
+    Полнотекстовый поиск со стеммингом ("юбки" находит "юбка") и
+    нечётким совпадением по названию (опечатки). Добавляет аннотацию rank.
+    """
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+
+    return queryset.filter(
+        Q(search_vector=search_query) | Q(name__trigram_similar=query)
+    ).annotate(
+        # float8, чтобы значение rank без потерь попадало в курсор пагинации
+        rank=Cast(
+            SearchRank(F('search_vector'), search_query) + TrigramSimilarity('name', query),
+            FloatField(),
+        )
+    )
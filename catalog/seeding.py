@@ -0,0 +1,84 @@
+import random
+
+from django.db import connection
+
+from .facets import collect_variant_facets
+from .models import Category, Product, ProductFacet, ProductVariant, SubCategory
+from .search import update_search_vectors
+
+SIZES = ["XS", "S", "M", "L", "XL"]
+COLORS = [
+    ("Черный", "#292b34"),
+    ("Белый", "#ffffff"),
+    ("Бежевый", "#d6c3a3"),
+    ("Синий", "#2f4b7c"),
+    ("Зеленый", "#3a6b35"),
+    ("Красный", "#c0392b"),
+]
+MATERIALS = ["Хлопок", "Лен", "Шерсть", "Вискоза", "Шелк", "Кашемир"]
+
+
+class Rollback(Exception):
+    """Используется командами, которые создают данные и откатывают их."""
+
+
+def seed_catalog(products_count, subcategories_count=20, batch_size=5000):
+    """
+    Быстро наполняет каталог синтетическими товарами (bulk_create, без
+    сигналов) для замеров и проверки планов запросов. Вызывать внутри
+    транзакции, которую потом нужно откатить.
+    Возвращает список созданных подкатегорий.
+    """
+    subcategories = []
+    for gender in ("F", "M"):
+        category = Category.objects.create(name=f"Seed {gender}", gender=gender)
+        subcategories += SubCategory.objects.bulk_create([
+            SubCategory(category=category, name=f"Seed {gender} {i}", size_model="standard")
+            for i in range(subcategories_count // 2 or 1)
+        ])
+
+    for offset in range(0, products_count, batch_size):
+        products = Product.objects.bulk_create([
+            Product(
+                subcategory=random.choice(subcategories),
+                name=f"Товар {offset + i}",
+                material=random.choice(MATERIALS),
+                price_rub=random.randint(1000, 20000),
+                price_kzt=random.randint(5000, 100000),
+                price_byn=random.randint(30, 700),
+                is_visible=random.random() > 0.1,
+            )
+            for i in range(min(batch_size, products_count - offset))
+        ])
+
+        variants = []
+        for product in products:
+            for color_name, color_hex in random.sample(COLORS, 2):
+                for size in random.sample(SIZES, 3):
+                    variants.append(ProductVariant(
+                        product=product,
+                        color_name=color_name,
+                        color_hex=color_hex,
+                        size=size,
+                        stock=random.randint(0, 10),
+                    ))
+        ProductVariant.objects.bulk_create(variants, batch_size=batch_size)
+
+        # Фасеты обычно пишут сигналы вариантов, bulk_create их не вызывает
+        facets = {}
+        for variant in variants:
+            facets.setdefault(variant.product_id, []).append(
+                (variant.size, variant.color_name, variant.color_hex)
+            )
+        ProductFacet.objects.bulk_create([
+            ProductFacet(product_id=product_id, **collect_variant_facets(rows))
+            for product_id, rows in facets.items()
+        ], batch_size=batch_size)
+
+    update_search_vectors(Product.objects.filter(subcategory__in=subcategories))
+
+    with connection.cursor() as cursor:
+        for model in (Category, SubCategory, Product, ProductVariant, ProductFacet):
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    return subcategories
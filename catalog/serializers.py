@@ -1,47 +1,106 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from django.conf import settings
 from .models import (
+    AVAILABLE,
     Category,
     SubCategory,
     Product,
+    ProductCard,
     ProductImage,
     ProductVariant,
 )
+from .bought_together import BOUGHT_TOGETHER_LIMIT, bought_together_ids
+from .fieldsets import SparseFieldsMixin
+from .cards import GALLERY_SIZE, SIZE_ORDER, collect_card
+from .images import image_metadata, srcset_sources
+from .queries import attach_subcategory_products, load_product_cards, ordered_cards
+from .similar import SIMILAR_LIMIT, fallback_similar_products, similar_product_ids
+
+CENT = Decimal('0.01')
+
+
+def price_representation(value):
+    """Цена так же, как её выводит DecimalField(decimal_places=2)."""
+    return f'{value.quantize(CENT):f}'
+
+
+class MediaUrlMixin:
+    """Абсолютные URL файлов и srcset уменьшенных копий (catalog.images)."""
+
+    def _absolute_url(self, url):
+        if url.startswith(("http://", "https://")):
+            return url
+
+        # Базовый адрес считается один раз на весь ответ
+        base_url = self.context.get('_base_url')
+        if base_url is None:
+            request = self.context.get("request")
+            base_url = request.build_absolute_uri("/") if request else settings.MEDIA_URL
+            base_url = self.context['_base_url'] = base_url.rstrip("/")
 
+        return base_url + url
 
-class CategorySerializer(serializers.ModelSerializer):
+    def _srcset(self, sources):
+        """{"webp": "url 160w, url 600w, ...", "original": ...} или None."""
+        if not sources:
+            return None
+
+        return {
+            key: ", ".join(f"{self._absolute_url(url)} {width}w" for url, width in urls)
+            for key, urls in sources.items()
+        }
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ('id', 'name', 'gender', 'order')
 
 
-class SubCategorySerializer(serializers.ModelSerializer):
+class SubCategorySerializer(SparseFieldsMixin, MediaUrlMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
+    cover_image_srcset = serializers.SerializerMethodField()
+    cover_image_meta = serializers.SerializerMethodField()
     products = serializers.SerializerMethodField()
     products_count = serializers.SerializerMethodField()
 
     class Meta:
         model = SubCategory
         fields = (
-            'id', 'name', 'size_model', 'cover_image', 'show_on_main',
+            'id', 'name', 'size_model', 'cover_image', 'cover_image_srcset', 'cover_image_meta', 'show_on_main',
             'is_material', 'description', 'order', 'category',
             'products', 'products_count'
         )
 
-    def get_products(self, obj):
-        request = self.context.get("request")
+    def _get_card_products(self, obj):
+        # Обычно карточки уже проставлены в представлении
+        # (attach_subcategory_products), здесь — запасной путь для одного объекта
+        if not hasattr(obj, 'card_products'):
+            attach_subcategory_products([obj])
+        return obj.card_products
 
-        if obj.is_material:
-            products = obj.material_products.all()
-        else:
-            products = obj.products.filter(is_visible=True)
+    def get_cover_image_srcset(self, obj):
+        return self._srcset(srcset_sources(obj.cover_image, obj.cover_image_derivatives))
 
-        return ProductListSerializer(products, many=True, context=self.context).data
+    def get_cover_image_meta(self, obj):
+        return image_metadata(obj, 'cover_image')
+
+    def get_products(self, obj):
+        products = self._get_card_products(obj)
+        return ProductListSerializer(
+            products,
+            many=True,
+            context=self.context,
+            **self.nested_fieldset('products')
+        ).data
 
     def get_products_count(self, obj):
-        if obj.is_material:
-            return obj.material_products.count()
-        return obj.products.filter(is_visible=True).count()
+        count = getattr(obj, 'card_products_count', None)
+        if count is None:
+            count = len(self._get_card_products(obj))
+        return count
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
@@ -51,16 +110,32 @@ class ProductImageSerializer(serializers.ModelSerializer):
 
 
 class ProductVariantSerializer(serializers.ModelSerializer):
+    # Покупателю показывается остаток за вычетом резерва неоплаченных заказов
+    stock = serializers.IntegerField(source='available', read_only=True)
+
     class Meta:
         model = ProductVariant
         fields = ('id', 'color_name', 'color_hex', 'size', 'stock')
 
+    def to_representation(self, obj):
+        return {
+            'id': obj.id,
+            'color_name': obj.color_name,
+            'color_hex': obj.color_hex,
+            'size': obj.size,
+            'stock': obj.available,
+        }
+
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(SparseFieldsMixin, MediaUrlMixin, serializers.ModelSerializer):
     main_image = serializers.ImageField()
+    main_image_srcset = serializers.SerializerMethodField()
+    main_image_meta = serializers.SerializerMethodField()
     subcategory = serializers.PrimaryKeyRelatedField(read_only=True)
     gallery = serializers.SerializerMethodField()
     colors = serializers.SerializerMethodField()
+    sizes = serializers.SerializerMethodField()
+    in_stock = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -72,48 +147,110 @@ class ProductListSerializer(serializers.ModelSerializer):
             'price_byn',
             'is_visible',
             'main_image',
+            'main_image_srcset',
+            'main_image_meta',
             'gallery',
             'colors',
+            'sizes',
+            'in_stock',
             'subcategory',
             'material',
         )
 
-    # ---- Галерея (2-3 изображения) ----
-    def get_gallery(self, obj):
-        if not hasattr(obj, 'images'):
-            return []
+    def to_representation(self, obj):
+        """
+        Быстрый путь без обхода полей DRF: словарь собирается прямо из
+        колонок товара и ProductCard. Вывод совпадает с обычным путём
+        (проверяет catalog.tests.FastSerializerTests). При ?fields= / ?omit=
+        часть колонок не загружена, тогда работает обычный путь.
+        """
+        if len(self.fields) != len(self.Meta.fields):
+            return super().to_representation(obj)
+
+        card = self._get_card(obj)
+        main_image = None
+        if obj.main_image:
+            main_image = obj.main_image.url
+            if self.context.get("request") is not None:
+                main_image = self._absolute_url(main_image)
+
+        return {
+            'id': obj.id,
+            'name': obj.name,
+            'price_rub': price_representation(obj.price_rub),
+            'price_kzt': price_representation(obj.price_kzt),
+            'price_byn': price_representation(obj.price_byn),
+            'is_visible': obj.is_visible,
+            'main_image': main_image,
+            'main_image_srcset': self.get_main_image_srcset(obj),
+            'main_image_meta': self.get_main_image_meta(obj),
+            'gallery': self.get_gallery(obj),
+            'colors': self.get_colors(obj),
+            'sizes': card["sizes"],
+            'in_stock': card["in_stock"],
+            'subcategory': obj.subcategory_id,
+            'material': obj.material,
+        }
 
-        request = self.context.get("request")
-        base_url = request.build_absolute_uri("/") if request else settings.MEDIA_URL
+    # ---- Данные карточки (ProductCard) ----
+    def _get_card(self, obj):
+        if hasattr(obj, '_card_data'):
+            return obj._card_data
+
+        try:
+            card = obj.card
+            data = {
+                "gallery": card.gallery,
+                "colors": card.colors,
+                "sizes": card.sizes,
+                "in_stock": card.in_stock,
+            }
+        except ProductCard.DoesNotExist:
+            # Карточка ещё не создана (сигнал срабатывает после коммита)
+            images = (
+                (img.id, img.image.url, srcset_sources(img.image, img.derivatives), image_metadata(img, 'image'))
+                for img in obj.images.order_by('order', 'id')[:GALLERY_SIZE]
+                if img.image
+            )
+            variants = obj.variants.values_list('color_name', 'color_hex', 'size', AVAILABLE)
+            data = collect_card(images, variants)
+
+        obj._card_data = data
+        return data
 
-        images = obj.images.all().order_by('order')[:3]
+    def get_main_image_srcset(self, obj):
+        return self._srcset(srcset_sources(obj.main_image, obj.main_image_derivatives))
 
+    def get_main_image_meta(self, obj):
+        return image_metadata(obj, 'main_image')
+
+    # ---- Галерея (2-3 изображения) ----
+    def get_gallery(self, obj):
         return [
             {
-                "id": img.id,
-                "image": request.build_absolute_uri(img.image.url)
-                if request
-                else base_url.rstrip("/") + img.image.url
+                "id": image["id"],
+                "image": self._absolute_url(image["image"]),
+                "srcset": self._srcset(image.get("srcset")),
+                "meta": image.get("meta"),
             }
-            for img in images
-            if img.image
+            for image in self._get_card(obj)["gallery"]
         ]
 
     # ---- Уникальные цвета ----
     def get_colors(self, obj):
-        if not hasattr(obj, 'variants'):
-            return []
-
-        unique = {}
-        for v in obj.variants.all():
-            if v.color_hex not in unique:
-                unique[v.color_hex] = v.color_name
-
+        # jsonb не сохраняет порядок ключей
         return [
-            {"name": name, "hex": hex_code}
-            for hex_code, name in unique.items()
+            {"name": color["name"], "hex": color["hex"]}
+            for color in self._get_card(obj)["colors"]
         ]
 
+    # ---- Размеры в наличии ----
+    def get_sizes(self, obj):
+        return self._get_card(obj)["sizes"]
+
+    def get_in_stock(self, obj):
+        return self._get_card(obj)["in_stock"]
+
 
 class SubCategorySimpleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -125,13 +262,16 @@ class SubCategorySimpleSerializer(serializers.ModelSerializer):
         )
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsMixin, MediaUrlMixin, serializers.ModelSerializer):
+    main_image_srcset = serializers.SerializerMethodField()
+    main_image_meta = serializers.SerializerMethodField()
     images = serializers.SerializerMethodField()
     variants = serializers.SerializerMethodField()
 
     colors = serializers.SerializerMethodField()
     sizes = serializers.SerializerMethodField()
     similar_products = serializers.SerializerMethodField()
+    bought_together = serializers.SerializerMethodField()
 
     subcategory = SubCategorySimpleSerializer(read_only=True)
 
@@ -148,6 +288,8 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'price_byn',
             'is_visible',
             'main_image',
+            'main_image_srcset',
+            'main_image_meta',
             'created_at',
             'material',
             'subcategory',
@@ -157,6 +299,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'colors',
             'sizes',
             'similar_products',
+            'bought_together',
         )
 
     # ---------- Gender ----------
@@ -166,10 +309,16 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         return None
 
     # ---------- Images ----------
+    def get_main_image_srcset(self, obj):
+        return self._srcset(srcset_sources(obj.main_image, obj.main_image_derivatives))
+
+    def get_main_image_meta(self, obj):
+        return image_metadata(obj, 'main_image')
+
     def get_images(self, obj):
         request = self.context.get("request")
 
-        images = obj.images.all().order_by("order")
+        images = obj.images.all()
 
         result = []
         for img in images:
@@ -183,7 +332,9 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
             result.append({
                 "id": img.id,
-                "image": url
+                "image": url,
+                "srcset": self._srcset(srcset_sources(img.image, img.derivatives)),
+                "meta": image_metadata(img, 'image'),
             })
 
         return result
@@ -196,7 +347,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
                 "color_name": v.color_name,
                 "color_hex": v.color_hex,
                 "size": v.size,
-                "stock": v.stock,
+                "stock": v.available,
             }
             for v in obj.variants.all()
         ]
@@ -216,38 +367,49 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
     # ---------- Sizes ----------
     def get_sizes(self, obj):
-        SIZE_ORDER = {
-            ProductVariant.Sizes.XXS: 0, ProductVariant.Sizes.XS: 1,
-            ProductVariant.Sizes.S: 2, ProductVariant.Sizes.M: 3,
-            ProductVariant.Sizes.L: 4, ProductVariant.Sizes.XL: 5,
-            ProductVariant.Sizes.XXL: 6, ProductVariant.Sizes.UNI: 7,
-        }
-
         size_map = {}
         for v in obj.variants.all():
             size_map.setdefault(v.size, 0)
-            size_map[v.size] += v.stock
+            size_map[v.size] += v.available
 
         sorted_sizes = sorted(size_map.items(), key=lambda x: SIZE_ORDER.get(x[0], 99))
 
         return [{"size": size, "stock": stock} for size, stock in sorted_sizes]
 
     # ---------- Similar Products ----------
+    def _related_cards(self, obj):
+        # Похожие и «покупают вместе» загружаются одной выборкой по id
+        if not hasattr(obj, '_related_cards'):
+            product_ids = (similar_product_ids(obj) or []) + bought_together_ids(obj)
+            obj._related_cards = load_product_cards(product_ids)
+        return obj._related_cards
+
     def get_similar_products(self, obj):
-        qs = (
-            Product.objects
-            .filter(
-                subcategory=obj.subcategory,
-                is_visible=True
-            )
-            .exclude(id=obj.id)
-            .select_related('subcategory')
-            .prefetch_related('images', 'variants')
-            .order_by('-created_at')[:4]
+        product_ids = similar_product_ids(obj)
+
+        if product_ids is None:
+            products = fallback_similar_products(obj)
+        else:
+            products = ordered_cards(product_ids, self._related_cards(obj), SIMILAR_LIMIT)
+
+        return ProductListSerializer(
+            products,
+            many=True,
+            context=self.context,
+            **self.nested_fieldset('similar_products')
+        ).data
+
+    # ---------- Bought Together ----------
+    def get_bought_together(self, obj):
+        products = ordered_cards(
+            bought_together_ids(obj),
+            self._related_cards(obj),
+            BOUGHT_TOGETHER_LIMIT,
         )
 
         return ProductListSerializer(
-            qs,
+            products,
             many=True,
-            context=self.context
-        ).data
\ No newline at end of file
+            context=self.context,
+            **self.nested_fieldset('bought_together')
+        ).data
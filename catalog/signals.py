@@ -1,22 +1,20 @@
-import os
 import requests
 import threading
 from django.conf import settings
+from django.db import transaction
 from django.urls import reverse
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import Product, ProductImage, SubCategory, ProductVariant
+from .cache import CATALOG_NAMESPACE, invalidate_on_commit
+from .models import Category, Product, ProductImage, SubCategory, ProductVariant
+from .cards import refresh_product_card
+from .facets import refresh_product_facet
+from .images import release_image, schedule_derivatives, update_image_metadata
+from .search import update_search_vectors
+from .similar import mark_neighbours_stale, refresh_similar_products
 from shop_config.models import TelegramConfig
 
 
-def safe_delete_file(file_field):
-    if file_field and file_field.path and os.path.exists(file_field.path):
-        try:
-            os.remove(file_field.path)
-        except Exception:
-            pass
-
-
 def send_low_stock_tg_async(product, variant):
     try:
         config = TelegramConfig.load()
@@ -58,20 +56,20 @@ def send_low_stock_tg_async(product, variant):
 
 @receiver(post_delete, sender=Product)
 def delete_product_files(sender, instance, **kwargs):
-    safe_delete_file(instance.main_image)
+    release_image(instance.main_image, instance.main_image_derivatives)
     for img in instance.images.all():
-        safe_delete_file(img.image)
+        release_image(img.image, img.derivatives)
 
 
 @receiver(post_delete, sender=ProductImage)
 def delete_product_image_file(sender, instance, **kwargs):
-    safe_delete_file(instance.image)
+    release_image(instance.image, instance.derivatives)
 
 
 @receiver(post_delete, sender=SubCategory)
 def delete_subcategory_related(sender, instance, **kwargs):
     instance.products.all().delete()
-    safe_delete_file(instance.cover_image)
+    release_image(instance.cover_image, instance.cover_image_derivatives)
 
 
 @receiver(post_save, sender=ProductVariant)
@@ -85,3 +83,112 @@ def notify_low_stock(sender, instance, **kwargs):
     )
     thread.daemon = True
     thread.start()
+
+
+@receiver(post_save, sender=Product)
+def create_product_facet(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: refresh_product_facet(instance.pk))
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def update_product_facet(sender, instance, **kwargs):
+    product_id = instance.product_id
+    transaction.on_commit(lambda: refresh_product_facet(product_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    invalidate_on_commit(CATALOG_NAMESPACE)
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(
+        lambda: update_search_vectors(Product.objects.filter(pk=product_id))
+    )
+
+
+@receiver(post_save, sender=SubCategory)
+def update_subcategory_search_vectors(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    subcategory_id = instance.pk
+    transaction.on_commit(
+        lambda: update_search_vectors(Product.objects.filter(subcategory_id=subcategory_id))
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_similar_products(sender, instance, **kwargs):
+    product_id = instance.pk
+
+    def refresh():
+        refresh_similar_products(product_id)
+        mark_neighbours_stale(product_id)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_similar_products(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: mark_neighbours_stale(product_id))
+
+
+@receiver(post_save, sender=Product)
+def create_product_card(sender, instance, created, **kwargs):
+    if created:
+        product_id = instance.pk
+        transaction.on_commit(lambda: refresh_product_card(product_id))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def update_product_card(sender, instance, **kwargs):
+    product_id = instance.product_id
+    transaction.on_commit(lambda: refresh_product_card(product_id))
+
+
+@receiver(post_save, sender=Product)
+def create_main_image_derivatives(sender, instance, **kwargs):
+    schedule_derivatives(instance, 'main_image', 'main_image_derivatives')
+
+
+@receiver(post_save, sender=ProductImage)
+def create_gallery_image_derivatives(sender, instance, **kwargs):
+    schedule_derivatives(instance, 'image', 'derivatives')
+
+
+@receiver(post_save, sender=SubCategory)
+def create_cover_image_derivatives(sender, instance, **kwargs):
+    schedule_derivatives(instance, 'cover_image', 'cover_image_derivatives')
+
+
+@receiver(pre_save, sender=Product)
+def store_main_image_metadata(sender, instance, **kwargs):
+    update_image_metadata(instance, 'main_image')
+
+
+@receiver(pre_save, sender=ProductImage)
+def store_gallery_image_metadata(sender, instance, **kwargs):
+    update_image_metadata(instance, 'image')
+
+
+@receiver(pre_save, sender=SubCategory)
+def store_cover_image_metadata(sender, instance, **kwargs):
+    update_image_metadata(instance, 'cover_image')
@@ -0,0 +1,139 @@
+from django.db.models import Case, Count, Exists, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from orders.models import OrderItem, OrderStatus
+
+from .models import Product, ProductVariant, SimilarProducts
+from .queries import with_product_cards
+
+SIMILAR_LIMIT = 4
+# Храним с запасом: скрытые после пересчёта товары отбрасываются при чтении
+SIMILAR_STORED = 12
+
+SUBCATEGORY_WEIGHT = 8
+MATERIAL_WEIGHT = 4
+COLOR_WEIGHT = 1
+CO_PURCHASE_WEIGHT = 3
+
+
+def _count_subquery(queryset, group_by, field):
+    return Coalesce(
+        Subquery(
+            queryset.order_by().values(group_by).annotate(n=Count(field, distinct=True)).values('n')[:1],
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def compute_similar_ids(product):
+    """
+    Кандидаты — видимые товары того же пола из той же подкатегории, с тем же
+    материалом или купленные вместе с товаром. Ранжирование одним запросом:
+    подкатегория, материал, общие цвета и число совместных заказов.
+    """
+    colors = list(
+        ProductVariant.objects.filter(product=product).values_list('color_name', flat=True).distinct()
+    )
+    paid_items = OrderItem.objects.exclude(
+        order__status__in=(OrderStatus.PENDING, OrderStatus.CANCELLED)
+    )
+    source_orders = paid_items.filter(variant__product_id=product.pk).values('order_id')
+    co_purchased = paid_items.filter(variant__product_id=OuterRef('pk'), order_id__in=source_orders)
+
+    candidates = Q(subcategory_id=product.subcategory_id) | Q(Exists(co_purchased))
+    same_material = Value(0)
+
+    if product.material:
+        candidates |= Q(material__iexact=product.material)
+        same_material = Case(
+            When(material__iexact=product.material, then=Value(MATERIAL_WEIGHT)),
+            default=Value(0),
+        )
+
+    shared_colors = _count_subquery(
+        ProductVariant.objects.filter(product=OuterRef('pk'), color_name__in=colors),
+        'product_id',
+        'color_name',
+    )
+    co_purchases = _count_subquery(
+        co_purchased,
+        'variant__product_id',
+        'order_id',
+    )
+
+    return list(
+        Product.objects.filter(
+            candidates,
+            is_visible=True,
+            subcategory__category__gender=product.subcategory.category.gender,
+        ).exclude(
+            pk=product.pk
+        ).annotate(
+            score=Case(
+                When(subcategory_id=product.subcategory_id, then=Value(SUBCATEGORY_WEIGHT)),
+                default=Value(0),
+            )
+            + same_material
+            + shared_colors * COLOR_WEIGHT
+            + co_purchases * CO_PURCHASE_WEIGHT
+        ).order_by(
+            '-score', '-created_at', '-id'
+        ).values_list('id', flat=True)[:SIMILAR_STORED]
+    )
+
+
+def refresh_similar_products(product_id):
+    product = Product.objects.select_related('subcategory__category').filter(pk=product_id).first()
+    if product is None:
+        return
+
+    SimilarProducts.objects.update_or_create(
+        product_id=product_id,
+        defaults={
+            'product_ids': compute_similar_ids(product),
+            'is_stale': False,
+        },
+    )
+
+
+def mark_neighbours_stale(product_id):
+    """
+    После изменения товара помечает для пересчёта списки, в которые он
+    может попасть или из которых должен выпасть.
+    """
+    product = Product.objects.filter(pk=product_id).values('subcategory_id', 'material').first()
+
+    affected = Q(product_ids__contains=[product_id])
+    if product is not None:
+        affected |= Q(product__subcategory_id=product['subcategory_id'])
+        if product['material']:
+            affected |= Q(product__material__iexact=product['material'])
+
+    SimilarProducts.objects.filter(affected).exclude(product_id=product_id).update(is_stale=True)
+
+
+def similar_product_ids(product):
+    """
+    id похожих товаров из SimilarProducts или None, если список ещё не
+    посчитан или устарел и неполон (например, товар был первым в подкатегории).
+    """
+    try:
+        similar = product.similar
+    except SimilarProducts.DoesNotExist:
+        return None
+
+    if similar.is_stale and len(similar.product_ids) < SIMILAR_LIMIT:
+        return None
+
+    return similar.product_ids
+
+
+def fallback_similar_products(product):
+    """Прежний запрос: новинки из той же подкатегории."""
+    return list(
+        with_product_cards(Product.objects)
+        .filter(subcategory_id=product.subcategory_id, is_visible=True)
+        .exclude(id=product.id)
+        .order_by('-created_at')[:SIMILAR_LIMIT]
+    )
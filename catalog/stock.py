@@ -0,0 +1,42 @@
+import threading
+
+from django.db import transaction
+
+from .cache import CATALOG_NAMESPACE, invalidate_on_commit
+from .cards import refresh_product_card
+from .models import ProductVariant
+from .signals import send_low_stock_tg_async
+
+LOW_STOCK = 2
+
+
+def stock_updated(variant_ids, notify=True):
+    """
+    Остатки или резервы вариантов изменены через QuerySet.update(), сигналы
+    не сработали: после коммита пересчитывает карточки товаров (размеры
+    в наличии), сбрасывает кэш каталога и уведомляет о заканчивающихся
+    вариантах. notify=False — без уведомления: резерв не меняет склад.
+    """
+    variant_ids = list(variant_ids)
+
+    def refresh():
+        variants = list(
+            ProductVariant.objects.select_related("product").filter(pk__in=variant_ids)
+        )
+
+        for product_id in {variant.product_id for variant in variants}:
+            refresh_product_card(product_id)
+
+        if not notify:
+            return
+
+        for variant in variants:
+            if variant.stock <= LOW_STOCK:
+                threading.Thread(
+                    target=send_low_stock_tg_async,
+                    args=(variant.product, variant),
+                    daemon=True,
+                ).start()
+
+    transaction.on_commit(refresh)
+    invalidate_on_commit(CATALOG_NAMESPACE)
@@ -0,0 +1,84 @@
+import re
+import threading
+from collections import OrderedDict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+from .cache import CATALOG_NAMESPACE, get_cache_version
+from .images import thumbnail_url
+from .models import Product
+from .search import SEARCH_CONFIG
+
+SUGGEST_LIMIT = 8
+SUGGEST_MAX_LIMIT = 20
+SUGGEST_CACHE_SIZE = 2048
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class LRUCache:
+    """Простой потокобезопасный LRU для горячих префиксов поиска."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+suggest_cache = LRUCache(SUGGEST_CACHE_SIZE)
+
+
+def prefix_tsquery(text):
+    """
+    'юбк ми' -> 'юбк:*AB & ми:*AB'
+    Префиксный поиск только по весам A и B: название, подкатегория, материал.
+    """
+    tokens = TOKEN_RE.findall(text.lower())
+    return ' & '.join(f'{token}:*AB' for token in tokens)
+
+
+def suggest_products(text, limit=SUGGEST_LIMIT):
+    raw_query = prefix_tsquery(text)
+    if not raw_query:
+        return []
+
+    key = (get_cache_version(CATALOG_NAMESPACE), raw_query, limit)
+    cached = suggest_cache.get(key)
+    if cached is not None:
+        return cached
+
+    search_query = SearchQuery(raw_query, config=SEARCH_CONFIG, search_type='raw')
+
+    rows = Product.objects.filter(
+        is_visible=True,
+        search_vector=search_query,
+    ).annotate(
+        rank=SearchRank(F('search_vector'), search_query)
+    ).order_by('-rank', '-id').values('id', 'name', 'main_image', 'main_image_derivatives')[:limit]
+
+    results = [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'thumbnail': thumbnail_url(row['main_image'], row['main_image_derivatives']),
+        }
+        for row in rows
+    ]
+
+    suggest_cache.set(key, results)
+    return results
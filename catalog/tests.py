@@ -0,0 +1,281 @@
+from collections import defaultdict
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from cart.models import Cart, CartItem
+from cart.serializers import CartItemSerializer
+from favorites.models import Favorite
+from orders.models import Order, OrderItem, OrderStatus
+from shop_config.models import DeliveryRegion, SiteConfig
+
+from .bought_together import add_pair_counts, count_pairs, refresh_top_k
+from .cache import CATALOG_NAMESPACE, SITE_CONFIG_NAMESPACE, bump_cache_version
+from .cards import collect_card, refresh_product_card
+from .facets import refresh_product_facet
+from .models import AVAILABLE, Category, Product, ProductCard, ProductImage, ProductVariant, SubCategory
+from .queries import with_product_cards
+from .search import update_search_vectors
+from .seeding import COLORS, seed_catalog
+from .serializers import ProductListSerializer, ProductVariantSerializer
+from .similar import refresh_similar_products
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# (метод, путь, число запросов). Пути с {полями} подставляются из
+# созданных данных. Запросы идут с токеном, поэтому в число входит
+# проверка токена, а для POST — ещё и SAVEPOINT. Число не должно
+# зависеть от числа товаров на странице, позиций корзины и заказов,
+# поэтому одни и те же значения проверяются на маленьком и большом
+# наборе. Запаса нет намеренно: это точное число запросов сегодня,
+# и лишний запрос (как и убранный) должен менять его здесь явно.
+ENDPOINTS = [
+    ("get", "/api/catalog/categories/", 2),
+    ("get", "/api/catalog/subcategories/?category={category}", 5),
+    ("get", "/api/catalog/subcategories/?category={category}&preview=4", 5),
+    ("get", "/api/catalog/subcategories/?category={category}&preview=0", 3),
+    ("get", "/api/catalog/subcategories/{subcategory}/", 3),
+    ("get", "/api/catalog/subcategories/{material}/", 4),
+    ("get", "/api/catalog/products/", 4),
+    ("get", "/api/catalog/products/?subcategory={subcategory}&size=M&color=Черный&sort=price_asc&currency=kzt", 4),
+    ("get", "/api/catalog/products/?material={material}", 5),
+    ("get", "/api/catalog/products/?pagination=cursor", 3),
+    ("get", "/api/catalog/products/search/?q=Платье", 4),
+    ("get", "/api/catalog/products/suggest/?q=Пла", 2),
+    ("get", "/api/catalog/products/{product}/", 5),
+    ("get", "/api/catalog/products/{product}/?fields=id,name,price_rub", 2),
+    ("get", "/api/catalog/products/?omit=gallery,colors,sizes,in_stock,filters", 3),
+    ("get", "/api/catalog/products/batch/?ids={product_ids}", 2),
+    ("get", "/api/favorites/", 2),
+    ("get", "/api/favorites/?pagination=cursor", 2),
+    ("post", "/api/favorites/toggle/", 8),
+    ("get", "/api/cart/", 4),
+    ("post", "/api/cart/add/", 9),
+    ("get", "/api/orders/history/", 3),
+    ("get", "/api/orders/preview/", 3),
+    ("get", "/api/orders/{order_number}/status/", 2),
+    ("get", "/api/orders/checkout/current-pending/", 2),
+    ("get", "/api/auth/me/", 2),
+    ("get", "/api/auth/orders/", 3),
+    ("get", "/api/shop-config/site-config/", 1),
+    # Последним: оформление заказа очищает корзину
+    ("post", "/api/orders/checkout/", 12),
+]
+
+CHECKOUT = {
+    "first_name": "Анна", "last_name": "Иванова", "phone": "+70000000000",
+    "country": "RU", "delivery_method": "cdek_pvz", "delivery_price": "0",
+    "currency": "rub",
+}
+
+
+def seed(user, scale):
+    """Каталог, избранное, корзина и заказы пользователя размером ~scale."""
+    category = Category.objects.create(name="Budget", gender="F")
+    subcategories = [
+        SubCategory.objects.create(category=category, name=f"Платья {i}", size_model="standard")
+        for i in range(scale)
+    ]
+    material = SubCategory.objects.create(
+        category=category, name="Хлопок", size_model="standard", is_material=True
+    )
+
+    products = []
+    for i in range(scale * 4):
+        product = Product.objects.create(
+            subcategory=subcategories[i % scale],
+            name=f"Платье {i}",
+            material="Хлопок",
+            price_rub=1000 + i,
+            price_kzt=5000 + i,
+            price_byn=30 + i,
+            main_image=f"products/main/budget_{i}.jpg",
+        )
+        for k in range(4):
+            ProductImage.objects.create(product=product, image=f"products/gallery/budget_{i}_{k}.jpg", order=k)
+        for color_name, color_hex in COLORS[:2]:
+            for size in ("S", "M", "L"):
+                ProductVariant.objects.create(
+                    product=product, color_name=color_name, color_hex=color_hex, size=size, stock=10
+                )
+        refresh_product_facet(product.id)
+        refresh_product_card(product.id)
+        products.append(product)
+
+    update_search_vectors(Product.objects.filter(pk__in=[p.pk for p in products]))
+
+    for product in products[:scale * 2]:
+        Favorite.objects.create(user=user, product=product)
+
+    cart, _ = Cart.objects.get_or_create(user=user)
+    for product in products[:scale * 2]:
+        CartItem.objects.create(cart=cart, variant=product.variants.first(), quantity=1)
+
+    DeliveryRegion.objects.get_or_create(code="RU")
+
+    orders = []
+    for i in range(scale):
+        order = Order.objects.create(user=user, status=OrderStatus.ASSEMBLY, country="RU", delivery_method="cdek_pvz")
+        for product in products[:scale]:
+            variant = product.variants.first()
+            OrderItem.objects.create(
+                order=order,
+                variant=variant,
+                product_name=product.name,
+                color=variant.color_name,
+                size=variant.size,
+                price_snapshot=product.price_rub,
+            )
+        orders.append(order)
+
+    # «Покупают вместе» по этим заказам, без ожидания команды
+    pairs = count_pairs([{products[0].id, products[-2].id, products[-1].id}] * scale)
+    add_pair_counts(pairs)
+    refresh_top_k({product_id for product_id, _ in pairs})
+    refresh_similar_products(products[-1].id)
+
+    return {
+        "category": category.id,
+        "subcategory": subcategories[0].id,
+        "material": material.id,
+        "product": products[-1].id,
+        "product_ids": ",".join(str(p.id) for p in reversed(products)),
+        "variant": products[-1].variants.last().id,
+        "order_number": orders[0].order_number,
+    }
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class QueryBudgetTests(TestCase):
+    """Число SQL-запросов API не растёт с размером данных."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="budget@example.com", email="budget@example.com")
+        self.client = APIClient(HTTP_HOST="localhost")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+    def check_budgets(self, scale):
+        # Файлов изображений нет, пути только для ответов API:
+        # метаданные и производные не читаются и не строятся
+        with mock.patch.multiple(
+            "catalog.signals",
+            update_image_metadata=mock.DEFAULT,
+            schedule_derivatives=mock.DEFAULT,
+        ):
+            context = seed(self.user, scale)
+
+        data = {
+            "/api/favorites/toggle/": {"product_id": context["product"]},
+            "/api/cart/add/": {"variant": context["variant"], "quantity": 1},
+            "/api/orders/checkout/": CHECKOUT,
+        }
+
+        for method, path, budget in ENDPOINTS:
+            with self.subTest(scale=scale, path=path):
+                # Кэш ответов сбрасывается, чтобы считать запросы самого представления
+                bump_cache_version(CATALOG_NAMESPACE)
+                bump_cache_version(SITE_CONFIG_NAMESPACE)
+                # SiteConfig читается из кэша, в число попадает только первый промах
+                SiteConfig.load_cached()
+
+                url = path.format(**context)
+                with self.assertNumQueries(budget):
+                    if method == "post":
+                        response = self.client.post(url, data[path], format="json", secure=True)
+                    else:
+                        response = self.client.get(url, secure=True)
+
+                self.assertLess(response.status_code, 400)
+
+    def test_small_catalog(self):
+        self.check_budgets(2)
+
+    def test_large_catalog(self):
+        self.check_budgets(12)
+
+
+class FastSerializerTests(TestCase):
+    """
+    Быстрый путь сериализаторов (ProductListSerializer,
+    ProductVariantSerializer, CartItemSerializer) выводит то же, что
+    обычный путь DRF, байт в байт.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Товары с карточками (половина — с главным фото), варианты и корзина."""
+        seeded = Product.objects.filter(subcategory__in=seed_catalog(100, subcategories_count=4))
+
+        products = list(seeded.order_by("id"))
+        for product in products[::2]:
+            product.main_image = f"products/main/fast_{product.id}.jpg"
+        Product.objects.bulk_update(products[::2], ["main_image"])
+
+        # Часть остатка зарезервирована: вывод должен показывать доступный остаток
+        ProductVariant.objects.filter(product__in=products[::3], stock__gt=0).update(reserved=1)
+
+        variants = defaultdict(list)
+        for row in ProductVariant.objects.filter(product__in=products).values_list(
+            "product_id", "color_name", "color_hex", "size", AVAILABLE
+        ):
+            variants[row[0]].append(row[1:])
+
+        ProductCard.objects.bulk_create([
+            ProductCard(
+                product_id=product.id,
+                **collect_card(
+                    [(product.id * 10 + k, f"/media/products/gallery/fast_{product.id}_{k}.jpg", None, None) for k in range(3)],
+                    variants[product.id],
+                ),
+            )
+            for product in products
+        ])
+
+        user = User.objects.create_user(username="fast@example.com")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, variant=variant, quantity=1 + variant.id % 3)
+            for variant in ProductVariant.objects.filter(product__in=products).order_by("product_id", "id").distinct("product_id")
+        ])
+
+        cls.products = seeded
+        cls.cart = cart
+
+    def setUp(self):
+        self.request = APIRequestFactory().get("/", HTTP_HOST="localhost")
+
+    def assert_same_output(self, serializer_class, items, context):
+        child = serializer_class(context=context)
+        renderer = JSONRenderer()
+
+        for obj in items:
+            self.assertEqual(
+                renderer.render(child.to_representation(obj)),
+                renderer.render(serializers.Serializer.to_representation(child, obj)),
+            )
+
+    def test_product_list(self):
+        self.assert_same_output(
+            ProductListSerializer,
+            with_product_cards(self.products).order_by("id"),
+            {"request": self.request},
+        )
+
+    def test_product_variant(self):
+        self.assert_same_output(
+            ProductVariantSerializer,
+            ProductVariant.objects.filter(product__in=self.products).order_by("id"),
+            {},
+        )
+
+    def test_cart_item(self):
+        self.assert_same_output(
+            CartItemSerializer,
+            self.cart.items.select_related("variant__product").order_by("id"),
+            {"request": self.request, "currency": "kzt"},
+        )
@@ -5,7 +5,9 @@ from .views import (
     SubCategoryDetailView,
     ProductListView,
     ProductDetailView,
-    ProductSearchView
+    ProductBatchView,
+    ProductSearchView,
+    ProductSuggestView,
 )
 
 urlpatterns = [
@@ -13,6 +15,8 @@ urlpatterns = [
     path('subcategories/', SubCategoryListView.as_view(), name='subcategory-list'),
     path('subcategories/<int:pk>/', SubCategoryDetailView.as_view(), name='subcategory-detail'),
     path('products/', ProductListView.as_view(), name='product-list'),
+    path('products/batch/', ProductBatchView.as_view(), name='product-batch'),
     path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
     path("products/search/", ProductSearchView.as_view()),
+    path("products/suggest/", ProductSuggestView.as_view(), name="product-suggest"),
 ]
\ No newline at end of file
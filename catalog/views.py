@@ -1,9 +1,26 @@
 from django.db.models import Prefetch, Count, Q
 from rest_framework import generics, permissions
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.db.models import Exists, OuterRef, Prefetch
 
+from .cache import CachedResponseMixin
+from .facets import build_facets
+from .fieldsets import SparseFieldsViewMixin
 from .models import Category, SubCategory, Product, ProductImage, ProductVariant
+from .pagination import KeysetPaginationMixin, ProductPagination
+from .queries import (
+    PRODUCT_BATCH_MAX,
+    SUBCATEGORY_PREVIEW_MAX,
+    ProductQuery,
+    attach_subcategory_products,
+    load_product_cards,
+    ordered_cards,
+    product_columns,
+    with_products_count,
+)
+from .suggest import SUGGEST_LIMIT, SUGGEST_MAX_LIMIT, suggest_products
 from .serializers import (
     CategorySerializer,
     SubCategorySerializer,
@@ -12,11 +29,50 @@ from .serializers import (
 )
 
 
-class ProductPagination(PageNumberPagination):
-    page_size = 16
+PRICE_FIELD_MAP = {
+    "rub": "price_rub",
+    "kzt": "price_kzt",
+    "byn": "price_byn",
+}
+
+
+class CurrencyPriceMixin:
+    """
+    Цена в валюте запроса (?currency=rub|kzt|byn): фильтр min_price/max_price
+    и сортировка price_asc/price_desc идут по одной и той же колонке,
+    для каждой валюты есть свой индекс.
+    """
+
+    SORT_MAP = {
+        "default": "-created_at",
+        "newest": "-created_at",
+        "price_asc": "{price}",
+        "price_desc": "-{price}",
+    }
+
+    def get_price_field(self):
+        currency = self.request.query_params.get("currency", "rub")
+        return PRICE_FIELD_MAP.get(currency, "price_rub")
+
+    def get_sort_map(self):
+        return self.SORT_MAP
 
+    def get_order_field(self):
+        sort_map = self.get_sort_map()
+        sort = self.request.query_params.get("sort", "default")
+        order_field = sort_map.get(sort, sort_map["default"])
+        return order_field.format(price=self.get_price_field())
 
-class CategoryListView(generics.ListAPIView):
+    def apply_price(self, query):
+        params = self.request.query_params
+        return query.price_range(
+            self.get_price_field(),
+            params.get("min_price"),
+            params.get("max_price"),
+        ).order_by(self.get_order_field())
+
+
+class CategoryListView(SparseFieldsViewMixin, CachedResponseMixin, generics.ListAPIView):
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
 
@@ -38,7 +94,26 @@ class CategoryListView(generics.ListAPIView):
         return qs.order_by('order', 'name')
 
 
-class SubCategoryListView(generics.ListAPIView):
+class SubCategoryProductsMixin(SparseFieldsViewMixin):
+    """
+    ?preview=N — вложить в подкатегорию только первые N карточек товаров
+    (preview=0 — только products_count), без параметра — все товары.
+    Если поле products не запрошено (?omit=products), карточки не загружаются.
+    """
+
+    def get_preview(self):
+        fields = self.get_selected_fields()
+        if fields is not None and 'products' not in fields:
+            return 0
+
+        try:
+            preview = int(self.request.query_params["preview"])
+        except (KeyError, ValueError):
+            return None
+        return max(0, min(preview, SUBCATEGORY_PREVIEW_MAX))
+
+
+class SubCategoryListView(SubCategoryProductsMixin, CachedResponseMixin, generics.ListAPIView):
     serializer_class = SubCategorySerializer
     permission_classes = [permissions.AllowAny]
 
@@ -64,134 +139,102 @@ class SubCategoryListView(generics.ListAPIView):
         if show_on_main and show_on_main.lower() in ('1', 'true', 'yes'):
             qs = qs.filter(show_on_main=True)
 
-        return qs.prefetch_related(
-            Prefetch(
-                'products',
-                queryset=Product.objects.filter(is_visible=True).prefetch_related('images', 'variants')
-            )
-        ).order_by('category__order', 'order')
+        return with_products_count(qs).order_by('category__order', 'order')
+
+    def list(self, request, *args, **kwargs):
+        subcategories = attach_subcategory_products(self.get_queryset(), self.get_preview())
+        serializer = self.get_serializer(subcategories, many=True)
+        return Response(serializer.data)
 
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(SparseFieldsViewMixin, KeysetPaginationMixin, CurrencyPriceMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = ProductPagination
 
-    SORT_MAP = {
-        "default": "-created_at",
-        "price_asc": "price_rub",
-        "price_desc": "-price_rub",
-        "newest": "-created_at",
-    }
-
     def get_queryset(self):
         params = self.request.query_params
 
-        qs = Product.objects.filter(is_visible=True)
-
-        subcategory_id = params.get("subcategory")
+        material_subcat = None
         material_id = params.get("material")
-        size_filters = params.getlist("size")
-        color_filters = params.getlist("color")
-
-        currency = params.get("currency", "rub")
-        price_min = params.get("min_price")
-        price_max = params.get("max_price")
-
-        price_field_map = {
-            "rub": "price_rub",
-            "kzt": "price_kzt",
-            "byn": "price_byn",
-        }
-
-        price_field = price_field_map.get(currency, "price_rub")
-
-        if subcategory_id:
-            qs = qs.filter(subcategory_id=subcategory_id)
 
         if material_id:
             material_subcat = SubCategory.objects.select_related('category').get(id=material_id)
-            material_gender = material_subcat.category.gender
-
-            # Фильтруем товары:
-            # 1) по названию материала
-            # 2) по полу категории товара (чтобы совпадал с полом материала)
-            qs = qs.filter(
-                material__iexact=material_subcat.name,
-                subcategory__category__gender=material_gender
-            )
-
-        if size_filters:
-            qs = qs.filter(variants__size__in=size_filters)
-
-        if color_filters:
-            qs = qs.filter(variants__color_name__in=color_filters)
-
-        if price_min:
-            qs = qs.filter(**{f"{price_field}__gte": price_min})
 
-        if price_max:
-            qs = qs.filter(**{f"{price_field}__lte": price_max})
-
-        sort = params.get("sort", "default")
-        order_field = self.SORT_MAP.get(sort, "-created_at")
+        query = (
+            ProductQuery()
+            .subcategory(params.get("subcategory"))
+            .material(material_subcat)
+            .variants(params.getlist("size"), params.getlist("color"))
+        )
 
-        return qs.select_related(
-            "subcategory",
-            "subcategory__category"
-        ).prefetch_related(
-            "images",
-            "variants"
-        ).distinct().order_by(order_field)
+        return self.apply_price(query).cards(self.get_selected_fields())
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
         page = self.paginate_queryset(queryset)
         serializer = self.get_serializer(page, many=True)
 
-        variants_qs = ProductVariant.objects.filter(product__in=queryset)
-
-        sizes = variants_qs.values_list("size", flat=True).order_by("size").distinct()
-        colors = variants_qs.values("color_name", "color_hex").order_by("color_name").distinct()
-
-        filters = {
-            "sizes": list(sizes),
-            "colors": list(colors)
-        }
-
         response = self.get_paginated_response(serializer.data)
-        response.data["filters"] = filters
+
+        # ?omit=filters — без подсчёта фильтров
+        if not self.is_omitted("filters"):
+            response.data["filters"] = build_facets(queryset, self.get_price_field())
 
         return response
 
 
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailView(SparseFieldsViewMixin, CachedResponseMixin, generics.RetrieveAPIView):
     serializer_class = ProductDetailSerializer
     permission_classes = [permissions.AllowAny]
 
-    queryset = Product.objects.filter(
-        is_visible=True
-    ).select_related(
-        'subcategory',
-        'subcategory__category'
-    ).prefetch_related(
-        Prefetch(
-            'images',
-            queryset=ProductImage.objects.order_by('order')
-        ),
-        Prefetch(
-            'variants',
-            queryset=ProductVariant.objects.only(
-                'id',
-                'product_id',
-                'color_name',
-                'color_hex',
-                'size',
-                'stock'
+    def get_queryset(self):
+        fields = self.get_selected_fields()
+        sparse = fields is not None
+        if not sparse:
+            fields = set(self.serializer_class.Meta.fields)
+
+        queryset = Product.objects.filter(is_visible=True)
+
+        if fields & {'subcategory', 'gender'}:
+            queryset = queryset.select_related('subcategory', 'subcategory__category')
+
+        # Похожие и «покупают вместе» загружаются одной выборкой, им нужны обе строки
+        if fields & {'similar_products', 'bought_together'}:
+            queryset = queryset.select_related('similar', 'bought_together')
+
+        if 'images' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    'images',
+                    queryset=ProductImage.objects.order_by('order')
+                )
             )
-        )
-    )
+
+        if fields & {'variants', 'colors', 'sizes'}:
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    'variants',
+                    queryset=ProductVariant.objects.only(
+                        'id',
+                        'product_id',
+                        'color_name',
+                        'color_hex',
+                        'size',
+                        'stock',
+                        'reserved'
+                    )
+                )
+            )
+
+        # При выборе полей невыбранные колонки (например, description) не читаются
+        if sparse:
+            columns = {field.name for field in Product._meta.concrete_fields}
+            needed = {'id', 'subcategory'} | product_columns(fields)
+            queryset = queryset.defer(*(columns - needed))
+
+        return queryset
 
     def get_serializer_context(self):
         return {
@@ -199,89 +242,79 @@ class ProductDetailView(generics.RetrieveAPIView):
         }
 
 
-class SubCategoryDetailView(generics.RetrieveAPIView):
-    serializer_class = SubCategorySerializer
+class ProductBatchView(SparseFieldsViewMixin, CachedResponseMixin, generics.ListAPIView):
+    """
+    Карточки нескольких товаров за один запрос: ?ids=3,1,2 (или ?ids=3&ids=1).
+    Порядок ответа совпадает с порядком ids, скрытые и несуществующие
+    товары пропускаются.
+    """
+    serializer_class = ProductListSerializer
     permission_classes = [permissions.AllowAny]
 
-    queryset = SubCategory.objects.select_related(
-        'category'
-    ).prefetch_related(
-        Prefetch(
-            'products',
-            queryset=Product.objects.filter(
-                is_visible=True
-            ).prefetch_related(
-                'images',
-                'variants'
-            )
-        )
-    )
+    def get_product_ids(self):
+        raw = ",".join(self.request.query_params.getlist("ids"))
 
+        try:
+            ids = [int(value) for value in raw.split(",") if value.strip()]
+        except ValueError:
+            raise ValidationError({"ids": "Ожидается список id через запятую"})
 
-class ProductSearchView(generics.ListAPIView):
-    serializer_class = ProductListSerializer
-    pagination_class = ProductPagination
-    permission_classes = [permissions.AllowAny]
+        # Повторы убираются с сохранением порядка
+        ids = list(dict.fromkeys(ids))
 
-    def get_queryset(self):
-        params = self.request.query_params
+        if len(ids) > PRODUCT_BATCH_MAX:
+            raise ValidationError({"ids": f"Не больше {PRODUCT_BATCH_MAX} товаров за запрос"})
 
-        query = params.get("q", "")
-        currency = params.get("currency", "rub")
-        sort = params.get("sort", "default")
+        return ids
 
-        price_field_map = {
-            "rub": "price_rub",
-            "kzt": "price_kzt",
-            "byn": "price_byn",
-        }
+    def list(self, request, *args, **kwargs):
+        ids = self.get_product_ids()
+        cards = load_product_cards(ids, self.get_selected_fields())
+        products = ordered_cards(ids, cards, len(ids))
+        serializer = self.get_serializer(products, many=True)
+        return Response(serializer.data)
 
-        price_field = price_field_map.get(currency, "price_rub")
 
-        qs = Product.objects.filter(
-            is_visible=True
-        ).select_related(
-            "subcategory",
-            "subcategory__category"
-        ).prefetch_related(
-            "images",
-            "variants"
-        )
+class SubCategoryDetailView(SubCategoryProductsMixin, CachedResponseMixin, generics.RetrieveAPIView):
+    serializer_class = SubCategorySerializer
+    permission_classes = [permissions.AllowAny]
+
+    queryset = with_products_count(SubCategory.objects.select_related('category'))
 
-        if query and query.strip():
-            qs = qs.filter(name__icontains=query.strip())
+    def get_object(self):
+        subcategory = super().get_object()
+        attach_subcategory_products([subcategory], self.get_preview())
+        return subcategory
 
-        subcategory = params.get("subcategory")
-        size_filters = params.getlist("size")
-        color_filters = params.getlist("color")
-        price_min = params.get("min_price")
-        price_max = params.get("max_price")
 
-        if subcategory:
-            qs = qs.filter(subcategory_id=subcategory)
+class ProductSearchView(SparseFieldsViewMixin, KeysetPaginationMixin, CurrencyPriceMixin, generics.ListAPIView):
+    serializer_class = ProductListSerializer
+    pagination_class = ProductPagination
+    permission_classes = [permissions.AllowAny]
 
-        if size_filters:
-            qs = qs.filter(variants__size__in=size_filters)
+    def get_search_query(self):
+        return self.request.query_params.get("q", "").strip()
 
-        if color_filters:
-            qs = qs.filter(variants__color_name__in=color_filters)
+    def get_sort_map(self):
+        sort_map = {**self.SORT_MAP, "relevance": "-created_at"}
 
-        if price_min:
-            qs = qs.filter(**{f"{price_field}__gte": price_min})
+        # rank есть только при непустом запросе
+        if self.get_search_query():
+            sort_map["default"] = sort_map["relevance"] = "-rank"
 
-        if price_max:
-            qs = qs.filter(**{f"{price_field}__lte": price_max})
+        return sort_map
 
-        SORT_MAP = {
-            "default": "-created_at",
-            "price_asc": price_field,
-            "price_desc": f"-{price_field}",
-            "newest": "-created_at",
-        }
+    def get_queryset(self):
+        params = self.request.query_params
 
-        order_field = SORT_MAP.get(sort, "-created_at")
+        query = (
+            ProductQuery()
+            .search(self.get_search_query())
+            .subcategory(params.get("subcategory"))
+            .variants(params.getlist("size"), params.getlist("color"))
+        )
 
-        return qs.distinct().order_by(order_field)
+        return self.apply_price(query).cards(self.get_selected_fields())
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -290,24 +323,36 @@ class ProductSearchView(generics.ListAPIView):
 
         serializer = self.get_serializer(page, many=True)
 
-        variants_qs = ProductVariant.objects.filter(product__in=queryset)
+        response = self.get_paginated_response(serializer.data)
 
-        sizes = variants_qs.values_list(
-            "size",
-            flat=True
-        ).order_by("size").distinct()
+        # ?omit=filters — без подсчёта фильтров
+        if not self.is_omitted("filters"):
+            response.data["filters"] = build_facets(queryset, self.get_price_field())
 
-        colors = variants_qs.values(
-            "color_name",
-            "color_hex"
-        ).order_by("color_name").distinct()
+        return response
 
-        filters = {
-            "sizes": list(sizes),
-            "colors": list(colors)
-        }
 
-        response = self.get_paginated_response(serializer.data)
-        response.data["filters"] = filters
+class ProductSuggestView(APIView):
+    permission_classes = [permissions.AllowAny]
 
-        return response
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+
+        try:
+            limit = int(request.query_params.get("limit", SUGGEST_LIMIT))
+        except ValueError:
+            limit = SUGGEST_LIMIT
+
+        limit = max(1, min(limit, SUGGEST_MAX_LIMIT))
+
+        results = [
+            {
+                **item,
+                "thumbnail": request.build_absolute_uri(item["thumbnail"])
+                if item["thumbnail"]
+                else None,
+            }
+            for item in suggest_products(query, limit)
+        ]
+
+        return Response({"results": results})
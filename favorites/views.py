@@ -5,10 +5,16 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from catalog.models import Product
+from catalog.pagination import KeysetPagination
+from catalog.queries import with_product_cards
 from .models import Favorite
 from .serializers import FavoriteSerializer
 
 
+class FavoriteCursorPagination(KeysetPagination):
+    page_size = 20
+
+
 class FavoriteToggleView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -64,16 +70,20 @@ class FavoriteListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        qs = Favorite.objects.filter(
+        qs = with_product_cards(Favorite.objects.filter(
             user=request.user
         ).select_related(
             "product",
             "product__subcategory",
             "product__subcategory__category"
-        ).prefetch_related(
-            "product__images",
-            "product__variants"
-        ).order_by("-created_at")
+        ), "product__").order_by("-created_at", "-id")
+
+        params = request.query_params
+        paginator = None
+
+        if params.get("pagination") == "cursor" or "cursor" in params:
+            paginator = FavoriteCursorPagination()
+            qs = paginator.paginate_queryset(qs, request, view=self)
 
         serializer = FavoriteSerializer(
             qs,
@@ -81,6 +91,13 @@ class FavoriteListView(APIView):
             context={"request": request}
         )
 
+        if paginator is None:
+            return Response({
+                "data": serializer.data
+            })
+
         return Response({
-            "data": serializer.data
+            "data": serializer.data,
+            "count": paginator.count,
+            "next": paginator.get_next_link(),
         })
\ No newline at end of file
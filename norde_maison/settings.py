@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -33,6 +34,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_extensions',
     'rest_framework',
     'rest_framework.authtoken',
@@ -94,6 +96,41 @@ DATABASES = {
     }
 }
 
+# Cache
+# Бэкенд выбирается переменной окружения CACHE_BACKEND: file | redis | locmem.
+# Кэш ответов сбрасывается сменой версии, которая хранится в самом кэше
+# (catalog.cache), поэтому все процессы gunicorn должны работать с одним
+# кэшем: file — общий каталог на одном сервере, redis — для нескольких
+# серверов. У locmem кэш свой в каждом процессе, и правка в админке доходит
+# до остальных процессов только по истечении RESPONSE_CACHE_TIMEOUT —
+# поэтому с ним время жизни ответов короткое (разработка, один процесс).
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "file")
+
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "norde-maison",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / "cache")),
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL", "redis://127.0.0.1:6379/1"),
+    },
+}
+
+CACHES = {
+    "default": CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKENDS["file"]),
+}
+
+SHARED_CACHE = CACHES["default"] is not CACHE_BACKENDS["locmem"]
+
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = 60 * 60 if SHARED_CACHE else 30
+
 TINYMCE_DEFAULT_CONFIG = {
     "height": 420,
     "width": "100%",
@@ -142,6 +179,9 @@ CORS_ALLOWED_ORIGINS = [
     "https://norde-maison-frontend.vercel.app"
 ]
 
+# Повторы оформления и добавления в корзину (cart.idempotency)
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+
 CSRF_TRUSTED_ORIGINS = [
     "https://morphism.pro",
     "https://www.morphism.pro",
@@ -183,6 +223,8 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
+# Число процессов для создания уменьшенных копий изображений
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
 
 YOOKASSA_SHOP_ID = "1305307"
 YOOKASSA_SECRET_KEY = "test_Gvf9reEgzw9GF_24Sn3tutuNxSX5q4ODJc9VfbWar14"
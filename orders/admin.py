@@ -6,6 +6,8 @@ from django.http import HttpResponse
 from django.core.files.base import ContentFile
 from django.utils import formats
 
+from catalog.images import thumbnail_url
+
 from .models import Order, OrderItem, OrderStatus, Report
 from .forms import ReportForm
 from .reports import generate_report_content
@@ -62,8 +64,9 @@ class OrderItemInline(admin.TabularInline):
 
     def product_preview(self, obj):
         if obj.variant and obj.variant.product and obj.variant.product.main_image:
+            product = obj.variant.product
             return mark_safe(
-                f'<img src="{obj.variant.product.main_image.url}" '
+                f'<img src="{thumbnail_url(product.main_image, product.main_image_derivatives)}" '
                 f'style="height:60px; width:48px; border-radius:6px; object-fit:cover;" />'
             )
         return "—"
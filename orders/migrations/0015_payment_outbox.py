@@ -0,0 +1,52 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:20
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def fill_payment_keys(apps, schema_editor):
+    # У каждого заказа свой ключ: default при добавлении поля один на все строки
+    Order = apps.get_model("orders", "Order")
+
+    orders = list(Order.objects.only("id"))
+    for order in orders:
+        order.payment_key = uuid.uuid4()
+    Order.objects.bulk_update(orders, ["payment_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='payment_key',
+            field=models.UUIDField(editable=False, null=True, verbose_name='Ключ идемпотентности платежа'),
+        ),
+        migrations.RunPython(fill_payment_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='payment_key',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, verbose_name='Ключ идемпотентности платежа'),
+        ),
+        migrations.CreateModel(
+            name='PaymentOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Платёж создан')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='payment_outbox', to='orders.order', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Заявка на платёж',
+                'verbose_name_plural': 'Заявки на платёж',
+                'indexes': [models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['created_at'], name='payment_outbox_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:40
+
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Exists, F, OuterRef, Sum
+from django.utils import timezone
+
+# Как orders.reservations.RESERVATION_TTL
+RESERVATION_TTL = timedelta(minutes=15)
+
+
+def reserve_pending_orders(apps, schema_editor):
+    """
+    Заказы, ожидавшие оплаты до перехода на резервы, списали остаток сразу
+    при оформлении, а отмена теперь возвращает только резерв. Списание
+    превращается в резерв: остаток возвращается и тут же резервируется,
+    дальше заказ идёт общим путём — оплата списывает резерв, отмена и
+    просрочка возвращают его в продажу.
+    """
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    StockReservation = apps.get_model("orders", "StockReservation")
+    ProductVariant = apps.get_model("catalog", "ProductVariant")
+
+    orders = Order.objects.filter(status="pending").filter(
+        ~Exists(StockReservation.objects.filter(order=OuterRef("pk")))
+    )
+    rows = (
+        OrderItem.objects.filter(order__in=orders, variant__isnull=False)
+        .values_list("order_id", "variant_id")
+        .annotate(quantity=Sum("quantity"))
+        .order_by("variant_id")
+    )
+
+    expires_at = timezone.now() + RESERVATION_TTL
+    reservations = []
+
+    for order_id, variant_id, quantity in rows:
+        ProductVariant.objects.filter(pk=variant_id).update(
+            stock=F("stock") + quantity,
+            reserved=F("reserved") + quantity,
+        )
+        reservations.append(StockReservation(
+            order_id=order_id, variant_id=variant_id, quantity=quantity, expires_at=expires_at
+        ))
+
+    StockReservation.objects.bulk_create(reservations)
+
+
+def unreserve_pending_orders(apps, schema_editor):
+    """Обратно: резерв ожидающих оплаты заказов снова списывается с остатка."""
+    StockReservation = apps.get_model("orders", "StockReservation")
+    ProductVariant = apps.get_model("catalog", "ProductVariant")
+
+    reservations = StockReservation.objects.filter(order__status="pending")
+
+    for variant_id, quantity in reservations.values_list("variant_id").annotate(quantity=Sum("quantity")).order_by():
+        ProductVariant.objects.filter(pk=variant_id).update(
+            stock=F("stock") - quantity,
+            reserved=F("reserved") - quantity,
+        )
+
+    reservations.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0020_productvariant_reserved'),
+        ('orders', '0015_payment_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(reserve_pending_orders, unreserve_pending_orders),
+    ]
@@ -53,6 +53,11 @@ class Order(models.Model):
         null=True,
         verbose_name="ID платежа YooKassa"
     )
+    payment_key = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        verbose_name="Ключ идемпотентности платежа"
+    )
     country = models.CharField(
         max_length=2,
         choices=Country.choices,
@@ -137,6 +142,71 @@ class OrderItem(models.Model):
         return self.price_snapshot * self.quantity
 
 
+class PaymentOutbox(models.Model):
+    """
+    Заявка на создание платежа ЮKassa. Пишется в одной транзакции с заказом,
+    сам платёж создаётся уже после коммита (orders.payments), неотправленные
+    заявки повторяет фоновая проверка заказов.
+    """
+    order = models.OneToOneField(
+        Order,
+        related_name="payment_outbox",
+        on_delete=models.CASCADE,
+        verbose_name="Заказ"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Платёж создан")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+
+    class Meta:
+        verbose_name = "Заявка на платёж"
+        verbose_name_plural = "Заявки на платёж"
+        indexes = [
+            # Выборка неотправленных заявок фоновой проверкой
+            models.Index(
+                fields=["created_at"],
+                name="payment_outbox_pending_idx",
+                condition=models.Q(sent_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.order} ({'отправлена' if self.sent_at else 'ожидает'})"
+
+
+class StockReservation(models.Model):
+    """
+    Резерв варианта под неоплаченный заказ. Сумма активных резервов
+    хранится в ProductVariant.reserved, см. orders.reservations.
+    """
+    order = models.ForeignKey(
+        Order,
+        related_name="reservations",
+        on_delete=models.CASCADE,
+        verbose_name="Заказ"
+    )
+    variant = models.ForeignKey(
+        "catalog.ProductVariant",
+        related_name="reservations",
+        on_delete=models.CASCADE,
+        verbose_name="Вариант товара"
+    )
+    quantity = models.PositiveIntegerField(verbose_name="Количество")
+    expires_at = models.DateTimeField(verbose_name="Действует до")
+
+    class Meta:
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товара"
+        indexes = [
+            # Очистка просроченных резервов
+            models.Index(fields=["expires_at"], name="reservation_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.order} / {self.variant_id} x {self.quantity}"
+
+
 class Report(models.Model):
     REPORT_TYPES = [
         ("sales_by_month", "Продажи по месяцам"),
@@ -0,0 +1,58 @@
+import logging
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrderStatus, PaymentOutbox
+from .utils.yookassa import create_payment
+
+logger = logging.getLogger(__name__)
+
+# Заявку, которую только что записало оформление, отправляет сам запрос;
+# фоновая проверка подхватывает её, только если запрос не справился
+OUTBOX_RETRY_AFTER = timedelta(seconds=30)
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BATCH = 50
+
+
+def initiate_payment(order):
+    """
+    Создаёт платёж ЮKassa для заказа. Вызывается вне транзакции БД:
+    HTTP-запрос не держит блокировки и соединение оформления.
+    Ключ идемпотентности постоянный для заказа (Order.payment_key), поэтому
+    повтор после таймаута, из фоновой проверки или параллельный вызов
+    возвращает тот же платёж, а не создаёт второй.
+    """
+    try:
+        payment = create_payment(order)
+    except Exception as e:
+        PaymentOutbox.objects.filter(order=order).update(
+            attempts=F("attempts") + 1,
+            last_error=str(e)[:1000],
+        )
+        raise
+
+    order.payment_id = payment.id
+    order.save(update_fields=["payment_id"])
+    PaymentOutbox.objects.filter(order=order, sent_at__isnull=True).update(
+        sent_at=timezone.now(),
+        attempts=F("attempts") + 1,
+    )
+    return payment
+
+
+def process_payment_outbox():
+    """Повторяет неотправленные заявки ещё не отменённых заказов."""
+    entries = PaymentOutbox.objects.filter(
+        sent_at__isnull=True,
+        created_at__lte=timezone.now() - OUTBOX_RETRY_AFTER,
+        attempts__lt=OUTBOX_MAX_ATTEMPTS,
+        order__status=OrderStatus.PENDING,
+    ).select_related("order").order_by("created_at")[:OUTBOX_BATCH]
+
+    for entry in entries:
+        try:
+            initiate_payment(entry.order)
+        except Exception:
+            logger.warning("Не удалось создать платёж заказа %s", entry.order, exc_info=True)
@@ -0,0 +1,167 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from catalog.models import ProductVariant
+from catalog.stock import stock_updated
+
+from .models import OrderStatus, StockReservation
+
+# Чуть дольше окна оплаты (10 минут). Резерв заказа, который ждёт оплаты,
+# не снимается и после срока: платёж может пройти позже (ЮKassa недоступна
+# для проверки), такой резерв снимает отмена заказа
+RESERVATION_TTL = timedelta(minutes=15)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, variant_id):
+        super().__init__(f"Недостаточно остатка варианта #{variant_id}")
+        self.variant_id = variant_id
+
+
+def _by_variant(rows):
+    totals = defaultdict(int)
+    for variant_id, quantity in rows:
+        totals[variant_id] += quantity
+    return dict(totals)
+
+
+def _per_variant(totals):
+    """Количество для каждого варианта — для одного UPDATE по всем строкам."""
+    return Case(
+        *[When(pk=variant_id, then=Value(quantity)) for variant_id, quantity in totals.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _lock_available(totals):
+    """
+    Блокирует строки вариантов (SELECT ... FOR UPDATE в порядке id, чтобы
+    параллельные оформления не ловили взаимоблокировку) и проверяет, что
+    доступного остатка хватает. Возвращает количество для UPDATE.
+    """
+    available = dict(
+        ProductVariant.objects.select_for_update()
+        .filter(pk__in=totals)
+        .order_by("pk")
+        .values_list("pk", F("stock") - F("reserved"))
+    )
+
+    for variant_id, quantity in sorted(totals.items()):
+        if available.get(variant_id, 0) < quantity:
+            raise InsufficientStock(variant_id)
+
+    return _per_variant(totals)
+
+
+def _update_available(totals, quantity, **values):
+    """
+    Один UPDATE по всем вариантам с условием stock - reserved >= количество.
+    Строки уже заблокированы, условие — последняя защита от ухода в минус.
+    """
+    updated = ProductVariant.objects.filter(
+        pk__in=totals, stock__gte=F("reserved") + quantity
+    ).update(**values)
+
+    if updated != len(totals):
+        raise InsufficientStock(min(totals))
+
+
+def reserve_stock(order, lines, ttl=RESERVATION_TTL):
+    """
+    Резервирует варианты под неоплаченный заказ, lines — (variant_id, quantity).
+    Вызывается внутри транзакции: InsufficientStock откатывает её целиком.
+    """
+    totals = _by_variant(lines)
+    quantity = _lock_available(totals)
+    _update_available(totals, quantity, reserved=F("reserved") + quantity)
+
+    expires_at = timezone.now() + ttl
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, variant_id=variant_id, quantity=quantity, expires_at=expires_at)
+        for variant_id, quantity in totals.items()
+    ])
+    stock_updated(totals, notify=False)
+
+
+def take_stock(lines):
+    """
+    Списывает остаток сразу (заказ без онлайн-оплаты), lines — (variant_id,
+    quantity). Вызывается внутри транзакции: InsufficientStock откатывает её.
+    """
+    totals = _by_variant(lines)
+    quantity = _lock_available(totals)
+    _update_available(totals, quantity, stock=F("stock") - quantity)
+    stock_updated(totals)
+
+
+def _take(reservations, skip_locked=False):
+    """
+    Блокирует и удаляет резервы, возвращает {variant_id: количество}.
+    skip_locked пропускает резервы, которые уже обрабатывает другая транзакция.
+    """
+    rows = list(
+        reservations.select_for_update(skip_locked=skip_locked).values_list("id", "variant_id", "quantity")
+    )
+    if not rows:
+        return {}
+
+    StockReservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+    return _by_variant(row[1:] for row in rows)
+
+
+@transaction.atomic
+def commit_reservations(order):
+    """
+    Заказ оплачен: резерв списывается с остатка одним UPDATE. Если резерва
+    нет (его сняли, пока заказ ждал оплаты), остаток списывается по позициям
+    заказа, а нехватка — InsufficientStock: оплаченный заказ, который нечем
+    собрать, не должен пройти молча.
+    """
+    totals = _take(StockReservation.objects.filter(order=order))
+    if not totals:
+        lines = order.items.filter(variant__isnull=False).values_list("variant_id", "quantity")
+        if lines:
+            take_stock(lines)
+        return
+
+    quantity = _per_variant(totals)
+    ProductVariant.objects.filter(pk__in=totals).update(
+        stock=Greatest(F("stock") - quantity, 0),
+        reserved=Greatest(F("reserved") - quantity, 0),
+    )
+    stock_updated(totals)
+
+
+def _release(reservations, skip_locked=False):
+    totals = _take(reservations, skip_locked)
+    if totals:
+        ProductVariant.objects.filter(pk__in=totals).update(
+            reserved=Greatest(F("reserved") - _per_variant(totals), 0),
+        )
+        stock_updated(totals, notify=False)
+    return sum(totals.values())
+
+
+@transaction.atomic
+def release_reservations(order):
+    """Заказ отменён: резерв возвращается в доступный остаток."""
+    return _release(StockReservation.objects.filter(order=order))
+
+
+@transaction.atomic
+def release_expired_reservations(now=None):
+    """
+    Снимает разом просроченные резервы заказов, которые уже не ждут оплаты,
+    но резерв за ними остался (статус сменили в обход сигналов).
+    """
+    return _release(
+        StockReservation.objects.filter(expires_at__lte=now or timezone.now())
+        .exclude(order__status=OrderStatus.PENDING),
+        skip_locked=True,
+    )
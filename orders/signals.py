@@ -4,13 +4,17 @@ import time
 import yookassa
 from datetime import timedelta
 from django.db.models import F
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from django.conf import settings
 from shop_config.models import TelegramConfig
+from cart.idempotency import purge_expired_keys
+from catalog.bought_together import forget_order
 from .models import Order, OrderStatus
+from .payments import process_payment_outbox
+from .reservations import commit_reservations, release_expired_reservations, release_reservations
 from .email_service import send_order_confirmation_email, send_order_status_email
 
 
@@ -175,6 +179,36 @@ def order_status_change(sender, instance, created, **kwargs):
             ).start()
 
 
+@receiver(post_save, sender=Order)
+def release_cancelled_order_stock(sender, instance, **kwargs):
+    if instance.status == OrderStatus.CANCELLED:
+        release_reservations(instance)
+
+
+@receiver(pre_delete, sender=Order)
+def release_deleted_order_stock(sender, instance, **kwargs):
+    release_reservations(instance)
+
+
+# Ожидающие оплаты и отменённые заказы в «покупают вместе» не учитываются
+UNPAID_STATUSES = (OrderStatus.PENDING, OrderStatus.CANCELLED)
+
+
+@receiver(post_save, sender=Order)
+def forget_cancelled_order_pairs(sender, instance, **kwargs):
+    old_status = getattr(instance, "_old_status", None)
+    if old_status is None or old_status in UNPAID_STATUSES or instance.status != OrderStatus.CANCELLED:
+        return
+
+    forget_order(instance.pk)
+
+
+@receiver(pre_delete, sender=Order)
+def forget_deleted_order_pairs(sender, instance, **kwargs):
+    if instance.status not in UNPAID_STATUSES:
+        forget_order(instance.pk)
+
+
 def check_pending_orders_periodically():
     def run():
         while True:
@@ -182,12 +216,17 @@ def check_pending_orders_periodically():
                 orders = Order.objects.filter(
                     status=OrderStatus.PENDING,
                     payment_verified=False
-                ).prefetch_related("items__variant")
+                )
 
                 now = timezone.now()
 
                 for order in orders:
                     if not order.payment_id:
+                        # Платёж так и не создался (заявки повторяет process_payment_outbox)
+                        if order.created_at < now - timedelta(minutes=10):
+                            order.status = OrderStatus.CANCELLED
+                            order.notified = False
+                            order.save()
                         continue
 
                     try:
@@ -201,6 +240,7 @@ def check_pending_orders_periodically():
                             order.payment_verified = True
                             order.notified = False
                             order.save()
+                            commit_reservations(order)
 
                             threading.Thread(
                                 target=_send_order_email_async,
@@ -215,10 +255,7 @@ def check_pending_orders_periodically():
                             ).start()
 
                     elif payment.status == "canceled" or order.created_at < now - timedelta(minutes=10):
-                        for item in order.items.all():
-                            item.variant.stock += item.quantity
-                            item.variant.save()
-
+                        # Резерв снимает release_cancelled_order_stock
                         order.status = OrderStatus.CANCELLED
                         order.notified = False
                         order.save()
@@ -226,6 +263,24 @@ def check_pending_orders_periodically():
             except Exception as e:
                 print(f"check_pending_orders error: {e}")
 
+            # Платежи, которые не удалось создать при оформлении
+            try:
+                process_payment_outbox()
+            except Exception as e:
+                print(f"process_payment_outbox error: {e}")
+
+            # Резервы, оставшиеся за заказами, которые уже не ждут оплаты
+            try:
+                release_expired_reservations()
+            except Exception as e:
+                print(f"release_expired_reservations error: {e}")
+
+            # Просроченные ключи идемпотентности оформления и корзины
+            try:
+                purge_expired_keys()
+            except Exception as e:
+                print(f"purge_expired_keys error: {e}")
+
             time.sleep(10)
 
     threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,136 @@
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.test import TransactionTestCase, override_settings, skipUnlessDBFeature
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from cart.models import Cart, CartItem
+from catalog.models import Category, Product, ProductVariant, SubCategory
+from shop_config.models import DeliveryRegion
+
+from .models import Order, StockReservation
+
+CHECKOUT = {
+    "first_name": "Анна", "last_name": "Иванова", "phone": "+70000000000",
+    "country": "RU", "delivery_method": "cdek_pvz", "delivery_price": "0",
+    "currency": "rub",
+}
+
+
+def fake_payment(order):
+    return SimpleNamespace(
+        id=f"concurrency-{order.pk}",
+        confirmation=SimpleNamespace(confirmation_url="https://example.com/pay"),
+    )
+
+
+@skipUnlessDBFeature("has_select_for_update")
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CheckoutConcurrencyTests(TransactionTestCase):
+    """
+    Много покупателей одновременно оформляют один вариант, остатка хватает
+    не всем. Остаток и резерв не должны уйти в минус, число заказов —
+    превысить доступный остаток. Потоки работают в своих соединениях,
+    поэтому нужен TransactionTestCase и PostgreSQL (SELECT ... FOR UPDATE).
+    Уведомления не отправляются, платёж ЮKassa подменяется.
+    """
+
+    buyers = 30
+    stock = 7
+
+    def setUp(self):
+        category = Category.objects.create(name="Concurrency", gender="F")
+        subcategory = SubCategory.objects.create(category=category, name="Concurrency", size_model="standard")
+        product = Product.objects.create(
+            subcategory=subcategory, name="Concurrency", price_rub=1000, price_kzt=5000, price_byn=30
+        )
+        self.variant = ProductVariant.objects.create(
+            product=product, color_name="Черный", color_hex="#292b34", size="M", stock=self.stock
+        )
+        DeliveryRegion.objects.create(code="RU")
+
+    def seed_buyers(self, quantity):
+        clients = []
+
+        for i in range(self.buyers):
+            user = User.objects.create_user(username=f"concurrency-{i}@example.com")
+            CartItem.objects.create(cart=Cart.objects.create(user=user), variant=self.variant, quantity=quantity)
+
+            client = APIClient(HTTP_HOST="localhost")
+            client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+            clients.append(client)
+
+        return clients
+
+    def run_checkouts(self, path, quantity):
+        clients = self.seed_buyers(quantity)
+        barrier = threading.Barrier(len(clients))
+        statuses = [None] * len(clients)
+
+        def checkout(index):
+            try:
+                barrier.wait()
+                statuses[index] = clients[index].post(
+                    path, CHECKOUT, format="json", secure=True
+                ).status_code
+            finally:
+                connection.close()
+
+        with (
+            mock.patch.multiple(
+                "orders.views",
+                _send_order_email_async=mock.DEFAULT,
+                _send_tg_notification_async=mock.DEFAULT,
+            ),
+            mock.patch("catalog.stock.send_low_stock_tg_async"),
+            mock.patch("orders.payments.create_payment", fake_payment),
+        ):
+            threads = [threading.Thread(target=checkout, args=(i,)) for i in range(len(clients))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertLessEqual(set(statuses), {200, 400})
+        self.assertEqual(statuses.count(200), min(self.buyers, self.stock // quantity))
+        self.assertEqual(Order.objects.count(), statuses.count(200))
+
+        self.variant.refresh_from_db()
+        return statuses.count(200) * quantity
+
+    def reserved_total(self):
+        return StockReservation.objects.filter(variant=self.variant).aggregate(
+            total=Coalesce(Sum("quantity"), 0)
+        )["total"]
+
+    def test_checkout_takes_stock(self):
+        for quantity in (1, 2):
+            with self.subTest(quantity=quantity):
+                ProductVariant.objects.filter(pk=self.variant.pk).update(stock=self.stock)
+                Order.objects.all().delete()
+                User.objects.all().delete()
+
+                taken = self.run_checkouts("/api/orders/checkout/", quantity)
+
+                self.assertEqual(self.variant.stock, self.stock - taken)
+                self.assertEqual(self.variant.reserved, 0)
+
+    def test_payment_checkout_reserves_stock(self):
+        for quantity in (1, 2):
+            with self.subTest(quantity=quantity):
+                # Удаление заказов снимает их резерв (release_deleted_order_stock)
+                Order.objects.all().delete()
+                User.objects.all().delete()
+
+                taken = self.run_checkouts("/api/orders/checkout/payment/", quantity)
+
+                # Остаток списывается только после оплаты
+                self.assertEqual(self.variant.stock, self.stock)
+                self.assertEqual(self.variant.reserved, taken)
+                self.assertEqual(self.reserved_total(), taken)
@@ -1,13 +1,13 @@
 import yookassa
 from django.conf import settings
-from uuid import uuid4
 
 yookassa.Configuration.account_id = settings.YOOKASSA_SHOP_ID
 yookassa.Configuration.secret_key = settings.YOOKASSA_SECRET_KEY
 
 
 def create_payment(order):
-    idempotence_key = str(uuid4())
+    # Ключ постоянный для заказа: повторный вызов вернёт тот же платёж
+    idempotence_key = str(order.payment_key)
 
     payment = yookassa.Payment.create({
         "amount": {
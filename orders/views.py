@@ -8,11 +8,13 @@ from django.utils.decorators import method_decorator
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from cart.models import Cart
+from cart.idempotency import idempotent
+from cart.services import load_cart
 from shop_config.models import DeliveryRegion
-from .models import Order, OrderItem, OrderStatus
+from .models import Order, OrderItem, OrderStatus, PaymentOutbox
+from .payments import initiate_payment
+from .reservations import InsufficientStock, commit_reservations, reserve_stock, take_stock
 from .serializers import CheckoutSerializer, OrderSerializer, OrderPreviewSerializer
-from .utils.yookassa import create_payment
 from .utils.exchange_rates import convert_to_rub
 from .signals import _send_order_email_async, _send_tg_notification_async
 from django.utils import timezone
@@ -38,11 +40,84 @@ def check_payment_status(payment_id):
     return payment.status == "succeeded"
 
 
+def build_snapshot(contents, currency):
+    """
+    Позиции заказа из доступных позиций корзины (cart.services.CartContents):
+    цена фиксируется в рублях по валюте оформления.
+    """
+    total_price_rub = Decimal("0")
+    snapshot_buffer = []
+
+    for line in contents.orderable:
+        variant = line["variant"]
+        price_rub = line["prices"]["rub"]
+        if currency in ("kzt", "byn"):
+            price_rub = convert_to_rub(line["prices"][currency], currency)
+
+        total_price_rub += price_rub * line["quantity"]
+        snapshot_buffer.append({
+            "variant": variant,
+            "product_name": line["product"].name,
+            "color": variant.color_name,
+            "size": variant.size,
+            "quantity": line["quantity"],
+            "price": price_rub,
+        })
+
+    return total_price_rub, snapshot_buffer
+
+
+def create_order_items(order, snapshot_buffer):
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            variant=item_data["variant"],
+            product_name=item_data["product_name"],
+            color=item_data["color"],
+            size=item_data["size"],
+            quantity=item_data["quantity"],
+            price_snapshot=item_data["price"],
+        )
+        for item_data in snapshot_buffer
+    ])
+
+
+def stock_lines(snapshot_buffer):
+    return [(item_data["variant"].id, item_data["quantity"]) for item_data in snapshot_buffer]
+
+
 class CheckoutPaymentView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @transaction.atomic
+    @idempotent
     def post(self, request):
+        # Заказ, резерв и заявка на платёж фиксируются одной транзакцией
+        order = self.commit_order(request)
+        if isinstance(order, Response):
+            return order
+
+        # Платёж создаётся уже после коммита: медленная ЮKassa не держит
+        # блокировки остатков и соединение с БД
+        try:
+            payment = initiate_payment(order)
+        except Exception:
+            # Заявку повторит фоновая проверка, ссылку отдаст current-pending
+            return Response({
+                "payment_url": None,
+                "order_id": order.id,
+                "order_number": order.order_number,
+                "payment_id": None
+            }, status=202)
+
+        return Response({
+            "payment_url": payment.confirmation.confirmation_url,
+            "order_id": order.id,
+            "order_number": order.order_number,
+            "payment_id": payment.id
+        })
+
+    @transaction.atomic
+    def commit_order(self, request):
         serializer = CheckoutSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
@@ -52,35 +127,12 @@ class CheckoutPaymentView(APIView):
         country = data["country"]
         delivery_method = data["delivery_method"]
 
-        cart = Cart.objects.prefetch_related("items__variant__product").filter(user=user).first()
-        if not cart or not cart.items.exists():
+        contents = load_cart(user)
+        if not contents:
             return Response({"detail": "Корзина пуста"}, status=400)
 
-        total_price_rub = Decimal("0")
-        snapshot_buffer = []
-
-        for item in cart.items.select_related("variant__product"):
-            variant = item.variant
-            product = variant.product
-            if not product.is_visible or variant.stock < item.quantity:
-                continue
-
-            if currency == "kzt":
-                price_rub = convert_to_rub(product.price_kzt, "kzt")
-            elif currency == "byn":
-                price_rub = convert_to_rub(product.price_byn, "byn")
-            else:
-                price_rub = product.price_rub
-
-            total_price_rub += price_rub * item.quantity
-            snapshot_buffer.append({
-                "variant": variant,
-                "product_name": product.name,
-                "color": variant.color_name,
-                "size": variant.size,
-                "quantity": item.quantity,
-                "price": price_rub,
-            })
+        cart = contents.cart
+        total_price_rub, snapshot_buffer = build_snapshot(contents, currency)
 
         if not snapshot_buffer:
             return Response({"detail": "Нет доступных товаров для оформления"}, status=400)
@@ -109,31 +161,19 @@ class CheckoutPaymentView(APIView):
             delivery_price=delivery_price_rub,
         )
 
-        for item_data in snapshot_buffer:
-            OrderItem.objects.create(
-                order=order,
-                variant=item_data["variant"],
-                product_name=item_data["product_name"],
-                color=item_data["color"],
-                size=item_data["size"],
-                quantity=item_data["quantity"],
-                price_snapshot=item_data["price"],
-            )
-            item_data["variant"].stock -= item_data["quantity"]
-            item_data["variant"].save()
+        create_order_items(order, snapshot_buffer)
 
-        cart.items.all().delete()
+        # Остаток списывается после оплаты, до неё товар в резерве
+        try:
+            reserve_stock(order, stock_lines(snapshot_buffer))
+        except InsufficientStock:
+            transaction.set_rollback(True)
+            return Response({"detail": "Товар закончился на складе"}, status=400)
 
-        payment = create_payment(order)
-        order.payment_id = payment.id
-        order.save(update_fields=["payment_id"])
+        cart.items.all().delete()
+        PaymentOutbox.objects.create(order=order)
 
-        return Response({
-            "payment_url": payment.confirmation.confirmation_url,
-            "order_id": order.id,
-            "order_number": order.order_number,
-            "payment_id": payment.id
-        })
+        return order
 
 
 class YookassaWebhookView(APIView):
@@ -150,6 +190,7 @@ class YookassaWebhookView(APIView):
                 order.status = OrderStatus.ASSEMBLY
                 order.payment_verified = True
                 order.save()
+                commit_reservations(order)
 
                 threading.Thread(target=_send_order_email_async, args=(order,), daemon=True).start()
                 threading.Thread(target=_send_tg_notification_async, args=(order,), daemon=True).start()
@@ -162,6 +203,7 @@ class YookassaWebhookView(APIView):
 class CheckoutView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     @transaction.atomic
     def post(self, request):
         serializer = CheckoutSerializer(data=request.data)
@@ -173,35 +215,12 @@ class CheckoutView(APIView):
         country = data["country"]
         delivery_method = data["delivery_method"]
 
-        cart = Cart.objects.prefetch_related("items__variant__product").filter(user=user).first()
-        if not cart or not cart.items.exists():
+        contents = load_cart(user)
+        if not contents:
             return Response({"detail": "Корзина пуста"}, status=400)
 
-        total_price_rub = Decimal("0")
-        snapshot_buffer = []
-
-        for item in cart.items.select_related("variant__product"):
-            variant = item.variant
-            product = variant.product
-            if not product.is_visible or variant.stock < item.quantity:
-                continue
-
-            if currency == "kzt":
-                price_rub = convert_to_rub(product.price_kzt, "kzt")
-            elif currency == "byn":
-                price_rub = convert_to_rub(product.price_byn, "byn")
-            else:
-                price_rub = product.price_rub
-
-            total_price_rub += price_rub * item.quantity
-            snapshot_buffer.append({
-                "variant": variant,
-                "product_name": product.name,
-                "color": variant.color_name,
-                "size": variant.size,
-                "quantity": item.quantity,
-                "price": price_rub,
-            })
+        cart = contents.cart
+        total_price_rub, snapshot_buffer = build_snapshot(contents, currency)
 
         if not snapshot_buffer:
             return Response({"detail": "Нет доступных товаров для оформления"}, status=400)
@@ -230,18 +249,13 @@ class CheckoutView(APIView):
             delivery_price=delivery_price_rub,
         )
 
-        for item_data in snapshot_buffer:
-            OrderItem.objects.create(
-                order=order,
-                variant=item_data["variant"],
-                product_name=item_data["product_name"],
-                color=item_data["color"],
-                size=item_data["size"],
-                quantity=item_data["quantity"],
-                price_snapshot=item_data["price"],
-            )
-            item_data["variant"].stock -= item_data["quantity"]
-            item_data["variant"].save()
+        create_order_items(order, snapshot_buffer)
+
+        try:
+            take_stock(stock_lines(snapshot_buffer))
+        except InsufficientStock:
+            transaction.set_rollback(True)
+            return Response({"detail": "Товар закончился на складе"}, status=400)
 
         cart.items.all().delete()
 
@@ -264,32 +278,22 @@ class OrderPreviewView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        cart = Cart.objects.prefetch_related("items__variant__product").filter(user=user).first()
-        if not cart or not cart.items.exists():
+        contents = load_cart(request.user)
+        if not contents:
             return Response({"detail": "Корзина пуста"}, status=400)
 
         items_data = []
-        subtotal_rub = Decimal("0")
-        subtotal_kzt = Decimal("0")
-        subtotal_byn = Decimal("0")
-
-        for item in cart.items.select_related("variant__product"):
-            variant = item.variant
-            product = variant.product
-            if not product.is_visible or variant.stock < item.quantity:
-                continue
-            subtotal_rub += product.price_rub * item.quantity
-            subtotal_kzt += product.price_kzt * item.quantity
-            subtotal_byn += product.price_byn * item.quantity
+        for line in contents.orderable:
+            variant = line["variant"]
+            product = line["product"]
             items_data.append({
                 "product_name": product.name,
                 "color": variant.color_name,
                 "size": variant.size,
-                "quantity": item.quantity,
-                "price_rub": product.price_rub,
-                "price_kzt": product.price_kzt,
-                "price_byn": product.price_byn,
+                "quantity": line["quantity"],
+                "price_rub": line["prices"]["rub"],
+                "price_kzt": line["prices"]["kzt"],
+                "price_byn": line["prices"]["byn"],
                 "image_url": request.build_absolute_uri(product.main_image.url) if product.main_image else None,
                 "product_id": product.id
             })
@@ -297,9 +301,9 @@ class OrderPreviewView(APIView):
         delivery_regions = DeliveryRegion.objects.all()
         serializer = OrderPreviewSerializer({
             "items": items_data,
-            "subtotal_rub": subtotal_rub,
-            "subtotal_kzt": subtotal_kzt,
-            "subtotal_byn": subtotal_byn,
+            "subtotal_rub": contents.subtotals["rub"],
+            "subtotal_kzt": contents.subtotals["kzt"],
+            "subtotal_byn": contents.subtotals["byn"],
             "delivery_regions": delivery_regions,
             "delivery_method_choices": ["cdek_pvz", "cdek_courier"],
         })
@@ -323,6 +327,7 @@ class PaymentStatusView(APIView):
                 order.payment_verified = True
                 order.notified = True
                 order.save(update_fields=['status', 'payment_verified', 'notified'])
+                commit_reservations(order)
 
                 threading.Thread(target=_send_order_email_async, args=(order,), daemon=True).start()
                 threading.Thread(target=_send_tg_notification_async, args=(order,), daemon=True).start()
@@ -367,10 +372,15 @@ class CurrentPendingOrderView(APIView):
                 payment = yookassa.Payment.find_one(order.payment_id)
                 payment_url = payment.confirmation.confirmation_url
             except:
-                payment = create_payment(order)
-                order.payment_id = payment.id
-                order.save(update_fields=["payment_id"])
+                payment = initiate_payment(order)
                 payment_url = payment.confirmation.confirmation_url
+        else:
+            # Платёж не создался при оформлении: тот же ключ, тот же платёж
+            try:
+                payment = initiate_payment(order)
+                payment_url = payment.confirmation.confirmation_url
+            except Exception:
+                pass
 
         return Response({
             "has_pending": True,
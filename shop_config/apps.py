@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ShopConfigConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "shop_config"
-    verbose_name = "Служебная информация"
\ No newline at end of file
+    verbose_name = "Служебная информация"
+
+    def ready(self):
+        import shop_config.signals
@@ -1,5 +1,7 @@
 from django.db import models
 
+from catalog.cache import SITE_CONFIG_NAMESPACE, get_cached_value
+
 
 class SingletonModel(models.Model):
     class Meta:
@@ -66,6 +68,11 @@ class SiteConfig(SingletonModel):
     channel_url = models.URLField(blank=True, verbose_name="Telegram канал")
     support_url = models.URLField(blank=True, verbose_name="Telegram поддержка")
 
+    @classmethod
+    def load_cached(cls):
+        # Сбрасывается сигналом shop_config.signals при сохранении настроек
+        return get_cached_value(SITE_CONFIG_NAMESPACE, "site_config", cls.load)
+
     class Meta:
         verbose_name = "Настройки сайта"
         verbose_name_plural = "Настройки сайта"
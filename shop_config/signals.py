@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from catalog.cache import SITE_CONFIG_NAMESPACE, invalidate_on_commit
+from .models import SiteConfig
+
+
+@receiver(post_save, sender=SiteConfig)
+@receiver(post_delete, sender=SiteConfig)
+def invalidate_site_config_cache(sender, instance, **kwargs):
+    invalidate_on_commit(SITE_CONFIG_NAMESPACE)
@@ -8,7 +8,8 @@ class SiteConfigView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        config = SiteConfig.load()
+        # Настройки читаются из кэша (SiteConfig.load_cached), ответ строится без БД
+        config = SiteConfig.load_cached()
         return Response({
             "channel_url": config.channel_url,
             "support_url": config.support_url
@@ -36,7 +36,7 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_support_url(self, obj):
-        return SiteConfig.load().support_url or ""
+        return SiteConfig.load_cached().support_url or ""
 
 
 class RegisterSerializer(serializers.ModelSerializer):
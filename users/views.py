@@ -1,6 +1,7 @@
 import uuid
 import threading
 from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework.authtoken.models import Token
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -21,7 +22,7 @@ from .serializers import (
     ChangePasswordSerializer,
     PasswordResetSerializer,
 )
-from orders.models import Order
+from orders.models import Order, OrderItem
 from orders.serializers import OrderDetailSerializer
 from secrets import compare_digest
 from django.core.exceptions import ValidationError
@@ -163,7 +164,7 @@ class UserOrderHistoryView(ListAPIView):
     def get_queryset(self):
         user = self.request.user
         orders = Order.objects.filter(user=user).prefetch_related(
-            'items__variant__product'
+            Prefetch('items', queryset=OrderItem.objects.select_related('variant__product'))
         ).order_by('-created_at')[:10]
 
         result = []